@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from .models import User
+
+# Claims CustomTokenObtainPairSerializer adds so requests can skip the user query
+USER_CLAIMS = ('email', 'is_staff', 'is_superuser')
+
+
+def user_cache_key(user_id):
+    return f'account:user:{user_id}'
+
+
+def get_cached_user(user_id):
+    """
+    The ``User`` for ``user_id``, cached for ``USER_CACHE_TIMEOUT`` seconds.
+    The password hash is deferred, so it never reaches the cache; it is
+    only read, and saved, when it is used.
+    """
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        try:
+            user = User.objects.defer('password').get(pk=user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        cache.set(key, user, timeout=settings.USER_CACHE_TIMEOUT)
+
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from the claims of an access token"""
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    def get_full_user(self):
+        return get_cached_user(self.id)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that trusts the token's claims instead of loading
+    the user row on every request. Deactivating a user therefore takes
+    effect when their access token expires.
+
+    Tokens issued before the claims were added fall back to the cached
+    full user.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return get_cached_user(user.id)
+        return user
+
+
+def get_full_user(user):
+    """The ``User`` model instance behind a request user"""
+    if isinstance(user, User):
+        return user
+    return user.get_full_user()
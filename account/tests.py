@@ -1,3 +1,98 @@
+import pickle
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsUser, user_cache_key
+from .models import User
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='customer@example.com', password='pass12345', full_name='Jane Doe'
+        )
+
+    def login(self, email='customer@example.com'):
+        response = self.client.post(
+            '/api/account/login/', {'email': email, 'password': 'pass12345'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['access']
+
+    def get(self, url, token):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_token_carries_user_claims(self):
+        token = AccessToken(self.login())
+        self.assertEqual(token['email'], 'customer@example.com')
+        self.assertFalse(token['is_staff'])
+        self.assertFalse(token['is_superuser'])
+
+    def test_authenticated_requests_skip_the_user_query(self):
+        response, queries = self.get('/api/store/carts/', self.login())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([sql for sql in queries if 'account_user' in sql])
+
+    def test_staff_claim_grants_admin_endpoints(self):
+        User.objects.create_user(email='admin@example.com', password='pass12345', is_staff=True)
+        token = self.login('admin@example.com')
+        response = self.client.post(
+            '/api/store/categories/', {'name': 'Toys'}, HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.post(
+            '/api/store/categories/', {'name': 'Toys'}, HTTP_AUTHORIZATION=f'Bearer {self.login()}'
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_profile_loads_full_user_through_cache(self):
+        token = self.login()
+        response, queries = self.get('/api/account/profile/', token)
+        self.assertEqual(response.data['full_name'], 'Jane Doe')
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.get('/api/account/profile/', token)
+        self.assertEqual(response.data['full_name'], 'Jane Doe')
+        self.assertEqual(queries, [])
+
+        response = self.client.patch(
+            '/api/account/profile/', {'full_name': 'Jane Smith'}, HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+        self.assertEqual(response.status_code, 200)
+        response, _ = self.get('/api/account/profile/', token)
+        self.assertEqual(response.data['full_name'], 'Jane Smith')
+
+    def test_tokens_without_claims_fall_back_to_the_user(self):
+        token = AccessToken.for_user(self.user)
+        response, queries = self.get('/api/store/carts/', str(token))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue([sql for sql in queries if 'account_user' in sql])
+
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get('/api/store/carts/', str(token))
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_user_leaves_out_the_password(self):
+        self.get('/api/account/profile/', self.login())
+        cached = cache.get(user_cache_key(self.user.id))
+        self.assertEqual(cached.full_name, 'Jane Doe')
+        self.assertNotIn('password', cached.__dict__)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cached))
 
-# Create your tests here.
+    def test_claims_user(self):
+        token = AccessToken(self.login())
+        user = ClaimsUser(token)
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.email, 'customer@example.com')
+        self.assertEqual(user.get_full_user(), self.user)
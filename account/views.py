@@ -1,6 +1,7 @@
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework_simplejwt.views import TokenObtainPairView
+from .authentication import get_full_user
 from .serializers import UserSerializer, UserRegistrationSerializer, CustomTokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 
@@ -15,7 +16,10 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        if self.request.method in SAFE_METHODS:
+            return get_full_user(self.request.user)
+        # Updates start from the current row rather than a cached copy
+        return User.objects.get(pk=self.request.user.pk)
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
@@ -0,0 +1,5 @@
+# Load the Celery app with Django so tasks published from web processes
+# use the configured broker
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
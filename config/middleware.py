@@ -0,0 +1,99 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from config import perf
+
+
+def view_label(request):
+    """``ViewSet.action`` for DRF viewsets, otherwise the URL name"""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is not None and actions:
+        return f'{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    if view_class is not None:
+        return view_class.__name__
+    return match.view_name or match.func.__name__
+
+
+class PerformanceMiddleware:
+    """
+    Profiles a sampled fraction (``PERF_SAMPLE_RATE``) of requests: wall
+    time, DB query count and time, and stages timed with ``perf.timer``.
+    Each profile is added to the per-view totals served at
+    ``/api/health/perf/`` and sent back in a ``Server-Timing`` header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        perf.instrument_connections()
+        profile, token = perf.start_profile()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.end_profile(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        # Sync code run for the view gets a copy of this context, so its
+        # queries are recorded by the wrapper on that thread's connections
+        profile, token = perf.start_profile()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.end_profile(token)
+        return self.finish(request, response, profile)
+
+    def sampled(self):
+        rate = settings.PERF_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def finish(self, request, response, profile):
+        size = None if response.streaming else len(response.content)
+        elapsed = perf.record(view_label(request), profile, size, settings.PERF_SLOW_QUERY_COUNT)
+
+        metrics = [f'db;dur={profile.db_time * 1000:.1f};desc="{len(profile.queries)} queries"']
+        metrics += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in profile.timings.items()]
+        metrics.append(f'total;dur={elapsed * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+
+class ASGIURLConfMiddleware:
+    """
+    Routes requests served over ASGI through ``ASGI_ROOT_URLCONF``, which
+    puts the async read views in front of the viewsets. Requests served
+    over WSGI keep ``ROOT_URLCONF``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if isinstance(request, ASGIRequest):
+            request.urlconf = settings.ASGI_ROOT_URLCONF
+        return self.get_response(request)
@@ -0,0 +1,7 @@
+"""
+MySQL database backend that reuses connections from a bounded
+per-process pool instead of opening one per request.
+
+Select it with ``'ENGINE': 'config.mysql_pool'`` and tune it with a
+``'POOL'`` dict in the database settings (see ``pool.DEFAULTS``).
+"""
@@ -0,0 +1,42 @@
+from django.db.backends.mysql import base as mysql_base
+
+from .pool import get_pool, is_enabled
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    """
+    The stock MySQL backend, except that opening and closing a connection
+    borrows it from and returns it to the process-wide pool. Keep
+    ``CONN_MAX_AGE`` at 0 so every request hands its connection back.
+    """
+
+    def get_new_connection(self, conn_params):
+        if not is_enabled():
+            self._pooled = False
+            return super().get_new_connection(conn_params)
+
+        parent = super()
+        pool = get_pool(
+            self.alias,
+            self.settings_dict.get('POOL'),
+            connect=lambda: parent.get_new_connection(conn_params),
+            ping=lambda connection: connection.ping(),
+        )
+        self._pooled = True
+        return pool.acquire()
+
+    def _close(self):
+        if self.connection is None or not getattr(self, '_pooled', False):
+            return super()._close()
+
+        pool = get_pool(self.alias, self.settings_dict.get('POOL'), None, None)
+        # A connection closed mid-transaction is still referenced by this
+        # wrapper, and one that raised may be broken, so neither goes back
+        discard = self.in_atomic_block or self.errors_occurred
+        if not discard and not self.get_autocommit():
+            try:
+                with self.wrap_database_errors:
+                    self.connection.rollback()
+            except Exception:
+                discard = True
+        pool.release(self.connection, discard=discard)
@@ -0,0 +1,188 @@
+import collections
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+DEFAULTS = {
+    'MAX_SIZE': 20,  # Connections open at once, in use or idle
+    'TIMEOUT': 10,  # Seconds to wait for a free connection before failing
+    'RECYCLE': 3600,  # Seconds after which a connection is replaced
+    'CHECK_AFTER': 5,  # Ping connections that sat idle longer than this
+}
+
+RATE_WINDOW = 60  # Seconds over which connects per second are averaged
+
+_pools = {}
+_pools_lock = threading.Lock()
+_enabled = True
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool of DB-API connections.
+
+    ``connect`` opens a new connection and ``ping`` raises if a connection
+    is no longer usable. The most recently returned connection is handed
+    out first, so idle ones age out under light load.
+    """
+
+    def __init__(self, connect, ping, max_size, timeout, recycle, check_after):
+        self.connect = connect
+        self.ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_after = check_after
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = collections.deque()
+        self._opened_at = {}
+        self._recent_connects = collections.deque()
+        self.in_use = 0
+        self.connects = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.discards = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise PoolTimeout(
+                    f'No database connection free after {self.timeout}s '
+                    f'(pool size {self.max_size})'
+                )
+
+        try:
+            connection = self._take_idle() or self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+        return connection
+
+    def release(self, connection, discard=False):
+        now = time.monotonic()
+        with self._lock:
+            self.in_use -= 1
+            if not discard:
+                self._idle.append((connection, now))
+        if discard:
+            self._discard(connection)
+        self._slots.release()
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+
+            now = time.monotonic()
+            if now - self._opened_at.get(id(connection), now) > self.recycle:
+                self._discard(connection)
+                continue
+            if now - returned_at > self.check_after:
+                try:
+                    self.ping(connection)
+                except Exception:
+                    self._discard(connection)
+                    continue
+            return connection
+
+    def _open(self):
+        connection = self.connect()
+        now = time.monotonic()
+        with self._lock:
+            self.connects += 1
+            self._opened_at[id(connection)] = now
+            self._recent_connects.append(now)
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            self.discards += 1
+            self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, collections.deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent_connects and now - self._recent_connects[0] > RATE_WINDOW:
+                self._recent_connects.popleft()
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'connects': self.connects,
+                'connects_per_second': len(self._recent_connects) / RATE_WINDOW,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'discards': self.discards,
+            }
+
+
+def get_pool(alias, options, connect, ping):
+    """
+    The pool for database ``alias``, created on first use in each process.
+    A pool inherited from a parent process is dropped without closing its
+    connections, which still belong to the parent.
+    """
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                for stale in [k for k in _pools if k[1] != key[1]]:
+                    del _pools[stale]
+                settings = {**DEFAULTS, **(options or {})}
+                pool = _pools[key] = ConnectionPool(
+                    connect,
+                    ping,
+                    max_size=settings['MAX_SIZE'],
+                    timeout=settings['TIMEOUT'],
+                    recycle=settings['RECYCLE'],
+                    check_after=settings['CHECK_AFTER'],
+                )
+    return pool
+
+
+def pool_stats():
+    """Stats of every pool in this process, by database alias"""
+    pid = os.getpid()
+    return {alias: pool.stats() for (alias, owner), pool in list(_pools.items()) if owner == pid}
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """Turn pooling on or off process-wide, for benchmarking"""
+    global _enabled
+    _enabled = enabled
+    if not enabled:
+        for pool in list(_pools.values()):
+            pool.close_idle()
@@ -0,0 +1,172 @@
+"""
+Per-request performance profiles, aggregated per view in each process.
+
+``PerformanceMiddleware`` starts a profile for a sampled fraction of
+requests. While it is active, every query on any database connection adds
+to its DB time and count, and code can time its own stages with
+``timer()``. Unsampled requests only pay for the sampling decision, as the
+query wrapper returns straight away when no profile is active.
+"""
+import contextlib
+import contextvars
+import heapq
+import threading
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Upper bounds, in milliseconds, of the request time histogram buckets
+HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+SLOW_QUERY_SQL_LENGTH = 500  # Characters of SQL kept for a slow query
+
+_current = contextvars.ContextVar('perf_profile', default=None)
+_stats = {}
+_slow_queries = []  # Min-heap of (duration, sequence, query)
+_sequence = 0
+_lock = threading.Lock()
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (duration in seconds, sql)
+        self.timings = {}  # Stage name -> seconds
+
+    @property
+    def db_time(self):
+        return sum(duration for duration, _ in self.queries)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_profile():
+    profile = Profile()
+    return profile, _current.set(profile)
+
+
+def end_profile(token):
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def timer(name):
+    """Add the time spent in the block to stage ``name`` of the current profile"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] = profile.timings.get(name, 0) + time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((time.perf_counter() - started, sql))
+
+
+def instrument(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_connections():
+    """Instrument the current thread's connections, including ones already open"""
+    for connection in connections.all():
+        instrument(connection)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+class ViewStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+        self.timings = {}
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+
+    def add(self, elapsed, profile, response_bytes):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.queries += len(profile.queries)
+        self.db_time += profile.db_time
+        self.response_bytes += response_bytes or 0
+        for name, seconds in profile.timings.items():
+            self.timings[name] = self.timings.get(name, 0) + seconds
+        milliseconds = elapsed * 1000
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if milliseconds <= bound:
+                self.histogram[i] += 1
+                break
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'requests': self.count,
+            'avg_ms': round(self.total / count * 1000, 2),
+            'max_ms': round(self.max * 1000, 2),
+            'avg_queries': round(self.queries / count, 2),
+            'avg_db_ms': round(self.db_time / count * 1000, 2),
+            'avg_response_bytes': round(self.response_bytes / count),
+            'avg_stage_ms': {
+                name: round(seconds / count * 1000, 2) for name, seconds in self.timings.items()
+            },
+            'histogram_ms': {
+                ('+Inf' if bound == float('inf') else str(bound)): hits
+                for bound, hits in zip(HISTOGRAM_BUCKETS, self.histogram)
+            },
+        }
+
+
+def record(label, profile, response_bytes, slow_query_count):
+    """Add a finished profile to the per-view totals and slowest queries"""
+    global _sequence
+    elapsed = profile.elapsed()
+    with _lock:
+        _stats.setdefault(label, ViewStats()).add(elapsed, profile, response_bytes)
+        for duration, sql in profile.queries:
+            if len(_slow_queries) >= slow_query_count and duration <= _slow_queries[0][0]:
+                continue
+            _sequence += 1
+            query = {'ms': round(duration * 1000, 2), 'view': label, 'sql': sql[:SLOW_QUERY_SQL_LENGTH]}
+            if len(_slow_queries) < slow_query_count:
+                heapq.heappush(_slow_queries, (duration, _sequence, query))
+            else:
+                heapq.heapreplace(_slow_queries, (duration, _sequence, query))
+    return elapsed
+
+
+def perf_stats():
+    """Totals for each view and the slowest queries seen by this process"""
+    with _lock:
+        return {
+            'views': {label: stats.as_dict() for label, stats in sorted(_stats.items())},
+            'slowest_queries': [query for _, _, query in sorted(_slow_queries, reverse=True)],
+        }
+
+
+def reset():
+    global _sequence
+    with _lock:
+        _stats.clear()
+        _slow_queries.clear()
+        _sequence = 0
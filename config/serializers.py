@@ -0,0 +1,37 @@
+"""
+Serializer base classes that time ``.data`` as the ``serialize`` stage of
+the current performance profile (see ``config.perf``), for a single object
+and for ``many=True`` lists alike.
+"""
+from rest_framework import serializers
+
+from config import perf
+
+
+class TimedDataMixin:
+    @property
+    def data(self):
+        with perf.timer('serialize'):
+            return super().data
+
+
+class ListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class TimedManyMixin(TimedDataMixin):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        # Unless the serializer's Meta picked a list serializer of its own
+        if type(serializer) is serializers.ListSerializer:
+            serializer.__class__ = ListSerializer
+        return serializer
+
+
+class Serializer(TimedManyMixin, serializers.Serializer):
+    pass
+
+
+class ModelSerializer(TimedManyMixin, serializers.ModelSerializer):
+    pass
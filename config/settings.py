@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -25,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.PerformanceMiddleware',  # Outermost, so it times everything below
+    'config.middleware.ASGIURLConfMiddleware',  # Before CommonMiddleware, which resolves URLs too
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -36,6 +39,7 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'config.urls'
+ASGI_ROOT_URLCONF = 'config.urls_asgi'  # Adds the async read views for requests served over ASGI
 
 TEMPLATES = [
     {
@@ -58,12 +62,19 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'config.mysql_pool',  # MySQL with a per-process connection pool
         'NAME': 'bettermart',
         'USER': 'admin',
         'PASSWORD': 'Admin@123',
         'HOST': '127.0.0.1',
         'PORT': '3306',
+        'CONN_MAX_AGE': 0,  # Connections go back to the pool after each request
+        'POOL': {
+            'MAX_SIZE': 20,
+            'TIMEOUT': 10,
+            'RECYCLE': 3600,
+            'CHECK_AFTER': 5,
+        },
     }
 }
 
@@ -88,11 +99,23 @@ AUTH_PASSWORD_VALIDATORS = [
 # REST Framework and JWT configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'account.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'store.pagination.CreatedAtCursorPagination',
+    # orjson-backed, falling back to the stdlib json ones without orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'config.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    'PAGE_SIZE': 50,
 }
 
 # JWT settings
@@ -103,8 +126,11 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
+    'TOKEN_USER_CLASS': 'account.authentication.ClaimsUser',
 }
 
+USER_CACHE_TIMEOUT = 60  # Seconds a full User loaded for a token user stays cached
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -125,6 +151,96 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+CELERY_BEAT_SCHEDULE = {
+    'relay-outbox-events': {
+        'task': 'store.tasks.relay_outbox_events',
+        'schedule': 30.0,
+    },
+    'update-trending-scores': {
+        'task': 'store.tasks.update_trending_scores',
+        'schedule': 300.0,
+    },
+    'compact-sales-rollups': {
+        'task': 'store.tasks.compact_sales_rollups',
+        'schedule': 60.0,
+    },
+}
+
+# Transactional outbox
+OUTBOX_BATCH_SIZE = 100  # Events published per relay batch
+OUTBOX_RELAY_IN_BACKGROUND = True  # Publish after commit from a background thread
+OUTBOX_RETENTION = 7 * 24 * 60 * 60  # Seconds published events are kept
+
+# Cache
+# Redis when CACHE_REDIS_URL is set (e.g. redis://localhost:6379/1), otherwise
+# a per-process in-memory cache
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# State Celery tasks share across worker processes (low stock alert dedupe
+# and digest scheduling, bulk email checkpoints), so always Redis, even when
+# the default cache is per process
+TASK_STATE_REDIS_URL = os.environ.get('TASK_STATE_REDIS_URL', f'{CELERY_BROKER_URL}/2')
+CACHES['tasks'] = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': TASK_STATE_REDIS_URL,
+    'KEY_PREFIX': 'tasks',
+}
+
+CATALOG_CACHE_TIMEOUT = 300  # Seconds a catalog response stays cached
+CATALOG_CACHE_LOCK_TIMEOUT = 10  # Seconds one worker may hold a rebuild
+CATALOG_CACHE_LOCK_POLLS = 20  # Times other workers check for the rebuild
+CATALOG_CACHE_LOCK_POLL_INTERVAL = 0.05
+CATALOG_HTTP_MAX_AGE = 0  # Seconds browsers reuse a catalog response before revalidating
+CATALOG_HTTP_SHARED_MAX_AGE = 5  # Seconds a CDN may serve it to anonymous clients
+CART_SUMMARY_CACHE_TIMEOUT = 300  # Seconds a user's cart summary stays cached
+
+# Catalog imports (store/catalog_import.py)
+CATALOG_IMPORT_BATCH_SIZE = 1000  # Rows validated and written per transaction
+CATALOG_IMPORT_MAX_ERRORS = 100  # Row errors listed in an import report, the rest are only counted
+
+# Trending products (store/trending.py)
+TRENDING_HALF_LIFE = 24 * 60 * 60  # Seconds after which a sale counts half
+TRENDING_WINDOW = 7 * 24 * 60 * 60  # Seconds of sales read on the first run
+TRENDING_SETTLE_DELAY = 60  # Seconds an order waits before it is counted
+TRENDING_MIN_SCORE = 0.01  # Scores decayed below this are removed
+TRENDING_MAX_LIMIT = 100  # Most products one trending request returns
+
+# Order exports (store/export.py)
+EXPORT_DIR = os.environ.get('EXPORT_DIR', BASE_DIR / 'exports')  # Where exports run by Celery are written
+EXPORT_CHUNK_SIZE = 2000  # Rows fetched per query and written out at a time
+
+# Sales analytics (store/analytics.py)
+ANALYTICS_COMPACTION_BATCH_SIZE = 5000  # Sales deltas folded into the rollups per transaction
+ANALYTICS_DEFAULT_DAYS = 30  # Days reported when no start date is given
+
+# Request profiling (config/middleware.py)
+PERF_SAMPLE_RATE = 0.05  # Fraction of requests profiled
+PERF_SLOW_QUERY_COUNT = 20  # Slowest queries kept per process
+
+# Inventory
+LOW_STOCK_THRESHOLD = 10  # Admins are alerted when an order leaves this many or fewer
+LOW_STOCK_ALERT_WINDOW = 300  # Seconds of alerts collected into one admin digest
+LOW_STOCK_ALERT_DEDUPE_TIMEOUT = 6 * 60 * 60  # Seconds before the same SKU can alert again
+
+# Bulk email
+BULK_EMAIL_CHUNK_SIZE = 500  # Recipients per Celery subtask and SMTP connection
+BULK_EMAIL_RATE_LIMIT = '30/m'  # Chunks started per worker
+BULK_EMAIL_CHECKPOINT_TIMEOUT = 7 * 24 * 60 * 60  # Seconds progress is kept for retries
+
+ORDER_CONFIRMATION_BATCH_SIZE = 200  # Orders loaded per query when sending confirmations in bulk
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
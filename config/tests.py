@@ -0,0 +1,221 @@
+import os
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from account.models import User
+from config import perf
+from config.mysql_pool.pool import ConnectionPool, PoolTimeout
+from config.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+def ping(connection):
+    if not connection.healthy:
+        raise OSError('gone away')
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        settings = {'max_size': 2, 'timeout': 0.05, 'recycle': 3600, 'check_after': 5, **options}
+        return ConnectionPool(FakeConnection, ping, **settings)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        self.assertEqual(pool.stats()['connects'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_pool_is_bounded(self):
+        pool = self.make_pool()
+        held = [pool.acquire(), pool.acquire()]
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        # A waiting caller gets the next connection returned
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.acquire()))
+        pool.timeout = 5
+        waiter.start()
+        pool.release(held[0])
+        waiter.join()
+        self.assertEqual(result, [held[0]])
+        self.assertEqual(pool.stats()['waits'], 2)
+
+    def test_unhealthy_and_old_connections_are_replaced(self):
+        pool = self.make_pool(check_after=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.healthy = False
+
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+        pool.release(replacement)
+        with mock.patch('config.mysql_pool.pool.time.monotonic', return_value=10 ** 9):
+            self.assertIsNot(pool.acquire(), replacement)
+        self.assertTrue(replacement.closed)
+
+    def test_discarded_connections_free_their_slot(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire()
+        pool.release(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.stats()['discards'], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(mock.Mock(side_effect=OSError), ping, 1, 0.05, 3600, 5)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.acquire()
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'price': Decimal('9.99'),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'label': gettext_lazy('Groceries'),
+        'name': 'Café \u2028 line',
+        'results': [{'id': 1, 'tags': ('a', 'b')}, None, True, 1.5],
+    }
+
+    def test_output_matches_drf_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+
+    def test_indented_output_falls_back(self):
+        media_type = 'application/json; indent=4'
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type),
+        )
+
+    def test_works_without_orjson(self):
+        with mock.patch('config.renderers.orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+            )
+            self.assertEqual(FastJSONParser().parse(BytesIO(b'{"a": [1]}')), {'a': [1]})
+
+    def test_parse(self):
+        body = FastJSONRenderer().render(self.data)
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+        for invalid in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        perf.reset()
+        self.client = APIClient()
+
+    def test_profiles_requests(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/store/products/')
+
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        stats = perf.perf_stats()
+        view = stats['views']['ProductViewSet.list']
+        self.assertEqual(view['requests'], 1)
+        self.assertEqual(view['avg_queries'], len(queries))
+        self.assertEqual(view['avg_response_bytes'], len(response.content))
+        self.assertEqual(sum(view['histogram_ms'].values()), 1)
+        self.assertEqual(len(stats['slowest_queries']), len(queries))
+
+    def test_times_serializers_of_every_view(self):
+        user = User.objects.create_user(email='user@example.com', password='pass12345')
+        self.client.force_authenticate(user)
+        for url in ('/api/store/categories/', '/api/account/profile/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    @override_settings(PERF_SLOW_QUERY_COUNT=2)
+    def test_keeps_slowest_queries(self):
+        for _ in range(3):
+            self.client.get('/api/store/products/?category=1')
+        slowest = perf.perf_stats()['slowest_queries']
+        self.assertEqual(len(slowest), 2)
+        self.assertGreaterEqual(slowest[0]['ms'], slowest[1]['ms'])
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_left_alone(self):
+        response = self.client.get('/api/store/products/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(perf.perf_stats()['views'], {})
+
+    def test_stats_endpoint(self):
+        url = '/api/health/perf/'
+        self.client.force_authenticate(
+            User.objects.create_user(email='user@example.com', password='pass12345')
+        )
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(User.objects.create_user(
+            email='admin@example.com', password='pass12345', is_staff=True
+        ))
+        self.client.get('/api/store/categories/')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('CategoryViewSet.list', response.data['views'])
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertNotIn('CategoryViewSet.list', perf.perf_stats()['views'])
+
+    async def test_async_views(self):
+        response = await self.async_client.get('/api/store/categories/')
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertIn('async-category-list', perf.perf_stats()['views'])
+
+
+class ASGIURLConfMiddlewareTests(TestCase):
+    async def test_only_asgi_requests_get_the_async_views(self):
+        response = await self.async_client.get('/api/store/categories/')
+        self.assertEqual(response.resolver_match.view_name, 'async-category-list')
+        response = await sync_to_async(self.client.get)('/api/store/categories/')
+        self.assertEqual(response.resolver_match.view_name, 'category-list')
+
+    def test_asgi_application_leaves_settings_alone(self):
+        import config.asgi  # noqa: F401
+
+        self.assertEqual(settings.ROOT_URLCONF, 'config.urls')
+        self.assertNotIn('DJANGO_ROOT_URLCONF', os.environ)
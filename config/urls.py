@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
+from config.views import DatabasePoolStatsView, PerformanceStatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/store/', include('store.urls')),
     path('api/account/', include('account.urls')),
+    path('api/health/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('api/health/perf/', PerformanceStatsView.as_view(), name='perf-stats'),
 ]
@@ -0,0 +1,12 @@
+"""
+URL configuration used when the app is served over ASGI: the async read
+endpoints in ``store.async_urls`` take precedence over the viewsets.
+"""
+from django.urls import include, path
+
+from config.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/store/', include('store.async_urls')),
+    *sync_urlpatterns,
+]
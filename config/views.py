@@ -0,0 +1,27 @@
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from config import perf
+from config.mysql_pool.pool import pool_stats
+
+
+class DatabasePoolStatsView(APIView):
+    """Connection pool usage of the worker process serving the request"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+class PerformanceStatsView(APIView):
+    """Request profiles of the worker process serving the request, per view"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(perf.perf_stats())
+
+    def delete(self, request):
+        perf.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,307 @@
+"""
+Sales and inventory rollups for the admin analytics endpoints.
+
+Creating, cancelling or deleting an order appends ``SalesDelta`` rows in the
+same transaction, which never touches a row another checkout could be
+updating. The ``compact_sales_rollups`` task folds the deltas into one row
+per day (``DailySales``), per day and product (``DailyProductSales``) and
+per day and category (``DailyCategorySales``), and snapshots the stock on
+hand of every category (``DailyStock``). An order with products of several
+categories counts once for each of them, but once for its day. Reports add
+the few deltas not compacted yet to the rollups, so they are exact without
+reading orders.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Category,
+    DailyCategorySales,
+    DailyProductSales,
+    DailySales,
+    DailyStock,
+    OrderItem,
+    Product,
+    RollupState,
+    SalesDelta,
+)
+
+TOTALS = ('orders', 'units', 'revenue')
+
+
+def record_order_sales(order, items, sign=1):
+    """
+    Append the deltas of ``order`` for ``(product_id, category_id,
+    quantity, price)`` items. ``sign=-1`` takes a cancelled or deleted
+    order back out of the rollups.
+    """
+    date = timezone.localdate(order.created_at)
+    lines = {}
+    for product_id, category_id, quantity, price in items:
+        _, units, revenue = lines.get(product_id, (category_id, 0, Decimal('0')))
+        lines[product_id] = (category_id, units + quantity, revenue + price * quantity)
+
+    counted = set()
+    deltas = []
+    for product_id, (category_id, units, revenue) in lines.items():
+        deltas.append(SalesDelta(
+            date=date,
+            product_id=product_id,
+            category_id=category_id,
+            orders=sign if category_id not in counted else 0,
+            day_orders=sign if not deltas else 0,
+            units=sign * units,
+            revenue=sign * revenue,
+        ))
+        counted.add(category_id)
+    SalesDelta.objects.bulk_create(deltas)
+
+
+def order_items(order):
+    return order.items.values_list('product_id', 'product__category_id', 'quantity', 'price')
+
+
+def upsert(model, rows, unique_fields, update_fields):
+    kwargs = {}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = unique_fields
+    model.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, update_fields=update_fields, **kwargs
+    )
+
+
+def fold_deltas(deltas):
+    """Add delta rows to the daily, daily product and daily category rollups"""
+    days = defaultdict(lambda: [0, 0, Decimal('0')])
+    products = defaultdict(lambda: [None, 0, Decimal('0')])
+    categories = defaultdict(lambda: [0, 0, Decimal('0')])
+    for delta in deltas:
+        day = days[delta['date']]
+        day[0] += delta['day_orders']
+        day[1] += delta['units']
+        day[2] += delta['revenue']
+        product = products[delta['date'], delta['product_id']]
+        product[0] = delta['category_id']
+        product[1] += delta['units']
+        product[2] += delta['revenue']
+        category = categories[delta['date'], delta['category_id']]
+        category[0] += delta['orders']
+        category[1] += delta['units']
+        category[2] += delta['revenue']
+
+    dates = set(days)
+    for date, orders, units, revenue in DailySales.objects.filter(date__in=dates).values_list('date', *TOTALS):
+        day = days[date]
+        day[0] += orders
+        day[1] += units
+        day[2] += revenue
+
+    existing = DailyProductSales.objects.filter(
+        date__in=dates, product_id__in={product_id for _, product_id in products}
+    ).values_list('date', 'product_id', 'category_id', 'units', 'revenue')
+    for date, product_id, category_id, units, revenue in existing:
+        if (date, product_id) in products:
+            product = products[date, product_id]
+            product[0] = category_id
+            product[1] += units
+            product[2] += revenue
+
+    existing = DailyCategorySales.objects.filter(
+        date__in=dates, category_id__in={category_id for _, category_id in categories}
+    ).values_list('date', 'category_id', *TOTALS)
+    for date, category_id, orders, units, revenue in existing:
+        if (date, category_id) in categories:
+            category = categories[date, category_id]
+            category[0] += orders
+            category[1] += units
+            category[2] += revenue
+
+    upsert(DailySales, [
+        DailySales(date=date, orders=orders, units=units, revenue=revenue)
+        for date, (orders, units, revenue) in days.items()
+    ], ['date'], list(TOTALS))
+    upsert(DailyProductSales, [
+        DailyProductSales(date=date, product_id=product_id, category_id=category_id, units=units, revenue=revenue)
+        for (date, product_id), (category_id, units, revenue) in products.items()
+    ], ['date', 'product'], ['units', 'revenue'])
+    upsert(DailyCategorySales, [
+        DailyCategorySales(date=date, category_id=category_id, orders=orders, units=units, revenue=revenue)
+        for (date, category_id), (orders, units, revenue) in categories.items()
+    ], ['date', 'category'], list(TOTALS))
+
+
+def compact_sales_rollups(batch_size=None):
+    """
+    Fold the pending deltas into the rollups, in batches, and snapshot
+    today's stock on hand. Returns the number of deltas compacted.
+    """
+    batch_size = batch_size or settings.ANALYTICS_COMPACTION_BATCH_SIZE
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            # One compaction at a time, as folding reads then writes the rollups
+            state, _ = RollupState.objects.select_for_update().get_or_create(pk=1)
+            deltas = list(
+                SalesDelta.objects.order_by('id')
+                .values('id', 'date', 'product_id', 'category_id', 'day_orders', *TOTALS)[:batch_size]
+            )
+            if deltas:
+                fold_deltas(deltas)
+                # Deleted by id, not by range, so a delta committed meanwhile
+                # with a lower id waits for the next batch
+                SalesDelta.objects.filter(id__in=[delta['id'] for delta in deltas]).delete()
+            else:
+                snapshot_stock()
+            state.compacted_at = timezone.now()
+            state.save()
+        compacted += len(deltas)
+        if not deltas:
+            return compacted
+
+
+def snapshot_stock(date=None):
+    """Record the current stock on hand of every category for ``date``"""
+    date = date or timezone.localdate()
+    stock = Product.objects.values('category_id').annotate(
+        products=Count('id'),
+        units=Sum('quantity'),
+        value=Sum(ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=16, decimal_places=2)
+        )),
+    ).order_by()
+    upsert(DailyStock, [
+        DailyStock(date=date, category_id=row['category_id'], products=row['products'],
+                   units=row['units'], value=row['value'])
+        for row in stock
+    ], ['date', 'category'], ['products', 'units', 'value'])
+
+
+def rebuild_sales_rollups():
+    """Recompute the sales rollups from every order, e.g. after the first deploy"""
+    with transaction.atomic():
+        RollupState.objects.select_for_update().get_or_create(pk=1)
+        SalesDelta.objects.all().delete()
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+
+        revenue = Sum(ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ))
+        items = OrderItem.objects.exclude(order__status='cancelled').annotate(
+            date=TruncDate('order__created_at'), category_id=F('product__category_id'),
+        )
+        DailySales.objects.bulk_create(
+            (
+                DailySales(**row)
+                for row in items.values('date')
+                .annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=revenue)
+                .order_by().iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+        DailyProductSales.objects.bulk_create(
+            (
+                DailyProductSales(**row)
+                for row in items.values('date', 'product_id', 'category_id')
+                .annotate(units=Sum('quantity'), revenue=revenue).order_by()
+                .iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+        DailyCategorySales.objects.bulk_create(
+            (
+                DailyCategorySales(**row)
+                for row in items.values('date', 'category_id')
+                .annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=revenue)
+                .order_by().iterator(chunk_size=2000)
+            ),
+            batch_size=2000,
+        )
+
+
+def with_pending(rollups, deltas, keys):
+    """
+    ``rollups`` rows plus the matching uncompacted ``deltas`` rows, both
+    grouped by ``keys``, summed per key
+    """
+    totals = {}
+    for row in [*rollups, *deltas]:
+        key = tuple(row[name] for name in keys)
+        if key in totals:
+            for name in TOTALS:
+                if name in row:
+                    totals[key][name] += row[name]
+        else:
+            totals[key] = dict(row)
+    return list(totals.values())
+
+
+def grouped(queryset, keys, fields=TOTALS, **annotations):
+    return list(
+        queryset.annotate(**annotations).values(*keys)
+        .annotate(**{name: Sum(name) for name in fields}).order_by()
+    )
+
+
+def sales_over_time(start, end, interval='day'):
+    """Orders, units and revenue of each day or month from ``start`` to ``end``"""
+    period = {'period': F('date') if interval == 'day' else TruncMonth('date')}
+    deltas = grouped(
+        SalesDelta.objects.filter(date__range=(start, end)), ['period'], ('day_orders', 'units', 'revenue'), **period
+    )
+    for row in deltas:
+        row['orders'] = row.pop('day_orders')
+    rows = with_pending(
+        grouped(DailySales.objects.filter(date__range=(start, end)), ['period'], **period), deltas, ['period'],
+    )
+    return sorted(rows, key=lambda row: row['period'])
+
+
+def sales_by_category(start, end):
+    """Orders, units and revenue of each category, best selling first"""
+    rows = with_pending(
+        grouped(DailyCategorySales.objects.filter(date__range=(start, end)), ['category_id']),
+        grouped(SalesDelta.objects.filter(date__range=(start, end)), ['category_id']),
+        ['category_id'],
+    )
+    names = Category.objects.in_bulk({row['category_id'] for row in rows})
+    for row in rows:
+        category = names.get(row['category_id'])
+        row['category_name'] = category.name if category else None
+    return sorted(rows, key=lambda row: row['revenue'], reverse=True)
+
+
+def sales_by_product(start, end, category_id=None, limit=10):
+    """Units and revenue of the ``limit`` best selling products"""
+    rollups = DailyProductSales.objects.filter(date__range=(start, end))
+    deltas = SalesDelta.objects.filter(date__range=(start, end))
+    if category_id is not None:
+        rollups, deltas = rollups.filter(category_id=category_id), deltas.filter(category_id=category_id)
+    rows = with_pending(
+        grouped(rollups, ['product_id'], ('units', 'revenue')),
+        grouped(deltas, ['product_id'], ('units', 'revenue')),
+        ['product_id'],
+    )
+    rows = sorted(rows, key=lambda row: row['revenue'], reverse=True)[:limit]
+    names = Product.objects.only('name', 'category_id').in_bulk({row['product_id'] for row in rows})
+    for row in rows:
+        product = names.get(row['product_id'])
+        row['product_name'] = product.name if product else None
+        row['category_id'] = product.category_id if product else None
+    return rows
+
+
+def stock_on_hand(start, end):
+    """Units and value in stock at the end of each day from ``start`` to ``end``"""
+    return list(
+        DailyStock.objects.filter(date__range=(start, end)).values('date')
+        .annotate(products=Sum('products'), units=Sum('units'), value=Sum('value'))
+        .order_by('date')
+    )
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import async_views
+
+# Matched ahead of store.urls when served over ASGI; anything not listed
+# here falls through to the router
+urlpatterns = [
+    path('products/', async_views.product_list, name='async-product-list'),
+    path('products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('categories/', async_views.category_list, name='async-category-list'),
+    path('carts/', async_views.cart_list, name='async-cart-list'),
+]
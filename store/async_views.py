@@ -0,0 +1,153 @@
+"""
+Async versions of the hot read endpoints, routed in place of the viewsets
+when the app is served over ASGI (see ``config/urls_asgi.py``).
+
+They reuse the viewsets' querysets, serializers, pagination and catalog
+cache, and only change how the request waits on the database and cache:
+an event loop can hold thousands of slow mobile connections while the
+queries run. Writes and any variant not handled here are passed on to
+the regular viewset.
+"""
+from asgiref.sync import sync_to_async
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from .cache import aget_catalog_last_modified, aget_catalog_version, aread_through
+from .conditional import CatalogValidators
+from .views import CartViewSet, CategoryViewSet, ProductViewSet
+
+product_list_view = ProductViewSet.as_view({'get': 'list', 'post': 'create'})
+product_detail_view = ProductViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'
+})
+category_list_view = CategoryViewSet.as_view({'get': 'list', 'post': 'create'})
+cart_list_view = CartViewSet.as_view({'get': 'list', 'post': 'create'})
+
+
+def make_view(viewset_view, request, **kwargs):
+    """
+    A viewset instance and DRF request set up as ``viewset_view`` sets them
+    up in ``dispatch``, so headers, negotiation and errors come out the same
+    """
+    view = viewset_view.cls(**viewset_view.initkwargs)
+    view.action_map = viewset_view.actions
+    for method, action in viewset_view.actions.items():
+        setattr(view, method, getattr(view, action))
+    view.args, view.kwargs = (), kwargs
+    view.request = drf_request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    return view, drf_request
+
+
+async def initial(view, request):
+    # Content negotiation, authentication, permissions and throttling, as
+    # the viewset would run them. Token users need no query, but tokens
+    # without claims fall back to loading the user, so off the event loop.
+    await sync_to_async(view.initial)(request)
+
+
+async def finalize(view, request, response):
+    response = view.finalize_response(request, response)
+    if isinstance(response.accepted_renderer, BrowsableAPIRenderer):
+        # The browsable API's forms query the database
+        await sync_to_async(response.render)()
+    else:
+        response.render()
+    return response
+
+
+async def handle_exception(view, request, exc):
+    """DRF's exception handling, or the exception re-raised if it has none"""
+    return await finalize(view, request, view.handle_exception(exc))
+
+
+async def paginated(view, queryset, request):
+    projection = view.get_values_projection()
+    paginator = view.paginator
+    page = await paginator.apaginate_queryset(projection.values(queryset), request, view=view)
+    return paginator.get_paginated_response(projection.represent(page)).data
+
+
+async def catalog_validators(request):
+    return CatalogValidators(
+        request, await aget_catalog_version(), await aget_catalog_last_modified(),
+        request.accepted_renderer.format,
+    )
+
+
+async def cached(view, request, producer, version):
+    if view.is_cacheable(request):
+        return await aread_through(request.build_absolute_uri(), producer, version)
+    return version, await producer()
+
+
+async def catalog_response(view, request, producer):
+    try:
+        await initial(view, request)
+        validators = await catalog_validators(request)
+        response = validators.not_modified(request)
+        if response is not None:
+            return response
+        version, data = await cached(view, request, producer, validators.version)
+        response = await finalize(view, request, Response(data))
+    except Exception as exc:
+        return await handle_exception(view, request, exc)
+    return validators.for_version(version).add_headers(response)
+
+
+@csrf_exempt
+async def product_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(product_list_view)(request)
+
+    view, drf_request = make_view(product_list_view, request)
+    return await catalog_response(
+        view, drf_request, lambda: paginated(view, view.get_queryset(), drf_request)
+    )
+
+
+@csrf_exempt
+async def product_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(product_detail_view)(request, pk=pk)
+
+    view, drf_request = make_view(product_detail_view, request, pk=pk)
+
+    async def retrieve():
+        product = await view.get_queryset().filter(pk=pk).afirst()
+        if product is None:
+            raise exceptions.NotFound('No Product matches the given query.')
+        return view.get_serializer(product).data
+
+    return await catalog_response(view, drf_request, retrieve)
+
+
+@csrf_exempt
+async def category_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(category_list_view)(request)
+
+    view, drf_request = make_view(category_list_view, request)
+
+    async def categories():
+        rows = [category async for category in view.get_queryset()]
+        return view.get_serializer(rows, many=True).data
+
+    return await catalog_response(view, drf_request, categories)
+
+
+@csrf_exempt
+async def cart_list(request):
+    # The single-product lookup keeps its own sync path
+    if request.method != 'GET' or 'product' in request.GET:
+        return await sync_to_async(cart_list_view)(request)
+
+    view, drf_request = make_view(cart_list_view, request)
+    try:
+        await initial(view, drf_request)
+        data = await paginated(view, view.get_queryset(), drf_request)
+    except Exception as exc:
+        return await handle_exception(view, drf_request, exc)
+    return await finalize(view, drf_request, Response(data))
@@ -0,0 +1,189 @@
+"""
+Synthetic dataset and request scenarios for the ``benchmark_api`` command.
+
+Every scenario builds one request from the seeded data and a
+``random.Random``, so a run with the same seed and sizes replays the same
+requests against the same rows.
+"""
+import itertools
+import statistics
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+
+from account.models import User
+from account.serializers import CustomTokenObtainPairSerializer
+from .models import Cart, Category, Order, OrderItem, Product
+from .search import rebuild_index
+
+DEFAULT_SIZES = {
+    'categories': 20,
+    'products': 5000,
+    'users': 200,
+    'carts_per_user': 5,
+    'orders_per_user': 3,
+    'items_per_order': 3,
+}
+
+PASSWORD = 'benchmark-pass-123'
+WORDS = (
+    'apple', 'banana', 'cherry', 'mango', 'melon', 'lemon', 'olive', 'pepper',
+    'tomato', 'potato', 'rice', 'bread', 'butter', 'cheese', 'yogurt', 'honey',
+    'coffee', 'tea', 'juice', 'water', 'soap', 'towel', 'brush', 'candle',
+)
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def saved(model, objects):
+    """``objects`` after ``bulk_create``, with primary keys even on MySQL"""
+    objects = model.objects.bulk_create(objects, batch_size=2000)
+    if objects and objects[0].pk is None:
+        objects = list(model.objects.order_by('-id')[:len(objects)])[::-1]
+    return objects
+
+
+class Dataset:
+    def __init__(self, rng, sizes):
+        self.category_ids = [
+            category.id for category in saved(Category, [
+                Category(name=f'{WORDS[i % len(WORDS)].title()} aisle {i}')
+                for i in range(sizes['categories'])
+            ])
+        ]
+        self.product_ids = [
+            product.id for product in saved(Product, [
+                Product(
+                    name=' '.join(rng.sample(WORDS, 3)).title(),
+                    category_id=rng.choice(self.category_ids),
+                    price=Decimal(rng.randint(100, 10000)) / 100,
+                    image_link='https://example.com/product.jpg',
+                    quantity=1_000_000,
+                    is_trending=rng.random() < 0.05,
+                )
+                for _ in range(sizes['products'])
+            ])
+        ]
+        rebuild_index()
+
+        # One hash for everyone, as hashing is deliberately slow
+        password = make_password(PASSWORD)
+        users = saved(User, [
+            User(email=f'bench{i}@example.com', password=password) for i in range(sizes['users'])
+        ])
+        self.admin = User.objects.create_user(
+            email='bench-admin@example.com', password=PASSWORD, is_staff=True
+        )
+        self.customers = users
+        self.tokens = {}
+        for user in [*users, self.admin]:
+            refresh = CustomTokenObtainPairSerializer.get_token(user)
+            self.tokens[user.id] = (str(refresh.access_token), str(refresh))
+
+        carts = saved(Cart, [
+            Cart(user_id=user.id, product_id=product_id, quantity=rng.randint(1, 5))
+            for user in users
+            for product_id in rng.sample(self.product_ids, sizes['carts_per_user'])
+        ])
+        self.carts = {}
+        for cart in carts:
+            self.carts.setdefault(cart.user_id, []).append((cart.id, cart.product_id))
+
+        orders = saved(Order, [
+            Order(user_id=user.id, total_amount=Decimal('0'), status='pending')
+            for user in users
+            for _ in range(sizes['orders_per_user'])
+        ])
+        self.orders = {}
+        items = []
+        for order in orders:
+            self.orders.setdefault(order.user_id, []).append(order.id)
+            for product_id in rng.sample(self.product_ids, sizes['items_per_order']):
+                items.append(OrderItem(
+                    order_id=order.id, product_id=product_id, quantity=1, price=Decimal('9.99')
+                ))
+        OrderItem.objects.bulk_create(items, batch_size=2000)
+
+        self.new_ids = itertools.count()
+
+    def access_token(self, user):
+        return self.tokens[user.id][0]
+
+    def refresh_token(self, user):
+        return self.tokens[user.id][1]
+
+
+def cart_item(data, rng, user):
+    return rng.choice(data.carts.get(user.id) or [(0, 0)])
+
+
+def order_items(data, rng, count):
+    return [{'product': product_id, 'quantity': 1} for product_id in rng.sample(data.product_ids, count)]
+
+
+# (name, method, who sends it, request builder returning (url, body)).
+# Reads come first, as the catalog writes invalidate the catalog cache.
+# Endpoints that queue Celery tasks directly (products/{id}/alert_low_stock/
+# and emails/) and the destructive cart deletes are left out.
+SCENARIOS = [
+    ('categories.list', 'get', 'anonymous', lambda d, r, u: ('/api/store/categories/', None)),
+    ('categories.retrieve', 'get', 'anonymous',
+     lambda d, r, u: (f'/api/store/categories/{r.choice(d.category_ids)}/', None)),
+    ('products.list', 'get', 'anonymous', lambda d, r, u: ('/api/store/products/', None)),
+    ('products.list_category', 'get', 'anonymous',
+     lambda d, r, u: (f'/api/store/products/?category={r.choice(d.category_ids)}', None)),
+    ('products.list_trending', 'get', 'anonymous',
+     lambda d, r, u: ('/api/store/products/?is_trending=true', None)),
+    ('products.list_name', 'get', 'anonymous',
+     lambda d, r, u: (f'/api/store/products/?name={r.choice(WORDS)}', None)),
+    ('products.search', 'get', 'anonymous',
+     lambda d, r, u: (f'/api/store/products/search/?q={r.choice(WORDS)[:r.randint(2, 5)]}', None)),
+    ('products.retrieve', 'get', 'anonymous',
+     lambda d, r, u: (f'/api/store/products/{r.choice(d.product_ids)}/', None)),
+    ('carts.list', 'get', 'customer', lambda d, r, u: ('/api/store/carts/', None)),
+    ('carts.list_product', 'get', 'customer',
+     lambda d, r, u: (f'/api/store/carts/?product={cart_item(d, r, u)[1]}', None)),
+    ('carts.retrieve', 'get', 'customer',
+     lambda d, r, u: (f'/api/store/carts/{cart_item(d, r, u)[0]}/', None)),
+    ('carts.summary', 'get', 'customer', lambda d, r, u: ('/api/store/carts/summary/', None)),
+    ('orders.list', 'get', 'customer', lambda d, r, u: ('/api/store/orders/', None)),
+    ('orders.retrieve', 'get', 'customer',
+     lambda d, r, u: (f'/api/store/orders/{r.choice(d.orders[u.id])}/', None)),
+    ('account.profile', 'get', 'customer', lambda d, r, u: ('/api/account/profile/', None)),
+    ('carts.create', 'post', 'customer',
+     lambda d, r, u: ('/api/store/carts/', {'product': r.choice(d.product_ids), 'quantity': 1})),
+    ('carts.bulk', 'post', 'customer',
+     lambda d, r, u: ('/api/store/carts/bulk/', {'items': order_items(d, r, 5)})),
+    ('carts.update', 'patch', 'customer',
+     lambda d, r, u: (f'/api/store/carts/{cart_item(d, r, u)[0]}/', {'quantity': r.randint(1, 5)})),
+    ('orders.create', 'post', 'customer',
+     lambda d, r, u: ('/api/store/orders/', {'items': order_items(d, r, 3)})),
+    ('account.profile_update', 'patch', 'customer',
+     lambda d, r, u: ('/api/account/profile/', {'full_name': f'Customer {r.randint(1, 1000)}'})),
+    ('account.register', 'post', 'anonymous', lambda d, r, u: ('/api/account/register/', {
+        'email': f'bench-new{next(d.new_ids)}@example.com',
+        'password': PASSWORD, 'password2': PASSWORD,
+    })),
+    ('account.login', 'post', 'anonymous', lambda d, r, u: ('/api/account/login/', {
+        'email': r.choice(d.customers).email, 'password': PASSWORD,
+    })),
+    ('account.token_refresh', 'post', 'anonymous', lambda d, r, u: ('/api/account/token/refresh/', {
+        'refresh': d.refresh_token(r.choice(d.customers)),
+    })),
+    ('categories.create', 'post', 'admin',
+     lambda d, r, u: ('/api/store/categories/', {'name': f'New aisle {next(d.new_ids)}'})),
+    ('categories.update', 'patch', 'admin', lambda d, r, u: (
+        f'/api/store/categories/{r.choice(d.category_ids)}/', {'image_link': 'https://example.com/new.jpg'}
+    )),
+    ('products.create', 'post', 'admin', lambda d, r, u: ('/api/store/products/', {
+        'name': f'New {r.choice(WORDS)} {next(d.new_ids)}', 'category': r.choice(d.category_ids),
+        'price': '4.99', 'image_link': 'https://example.com/product.jpg',
+    })),
+    ('products.update', 'patch', 'admin', lambda d, r, u: (
+        f'/api/store/products/{r.choice(d.product_ids)}/', {'price': f'{r.randint(100, 9999) / 100:.2f}'}
+    )),
+]
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Category, Product
+
+CATALOG_VERSION_KEY = 'store:catalog:version'
+CATALOG_MODIFIED_KEY = 'store:catalog:modified'
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction or a restart
+        # never lines up with keys written under an older version
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+
+
+def catalog_updated_at():
+    """Timestamp of the latest category or product change in the database"""
+    latest = [
+        model.objects.aggregate(latest=Max('updated_at'))['latest']
+        for model in (Category, Product)
+    ]
+    latest = [value.timestamp() for value in latest if value is not None]
+    return max(latest, default=0)
+
+
+def get_catalog_last_modified():
+    """
+    When the catalog last changed, as a timestamp. Set by every version bump
+    so it covers deletes; the database is only asked when the cache lost it.
+    """
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        cache.add(CATALOG_MODIFIED_KEY, catalog_updated_at(), timeout=None)
+        modified = cache.get(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+def read_through(key, producer, version=None, timeout=None):
+    """
+    Return the cached value for ``key`` under ``version``, the current
+    catalog version by default, calling ``producer`` to fill it on a miss.
+    A ``None`` from the producer is passed through without being cached.
+
+    Only one caller rebuilds a missing entry. The others serve the value
+    from before the last invalidation if there is one, or wait briefly for
+    the rebuild before falling back to the producer themselves. Returns the
+    value with the version it was built under, which is older than the one
+    asked for when a previous value is served.
+    """
+    if version is None:
+        version = get_catalog_version()
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    versioned_key = f'store:catalog:{version}:{key}'
+    previous_key = f'store:catalog:previous:{key}'
+    lock_key = f'{versioned_key}:lock'
+
+    value = cache.get(versioned_key)
+    if value is not None:
+        return version, value
+
+    if not cache.add(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        previous = cache.get(previous_key)
+        if previous is not None:
+            return previous
+        for _ in range(settings.CATALOG_CACHE_LOCK_POLLS):
+            time.sleep(settings.CATALOG_CACHE_LOCK_POLL_INTERVAL)
+            value = cache.get(versioned_key)
+            if value is not None:
+                return version, value
+        return version, producer()
+
+    try:
+        value = producer()
+        if value is not None:
+            cache.set_many({versioned_key: value, previous_key: (version, value)}, timeout=timeout)
+    finally:
+        cache.delete(lock_key)
+    return version, value
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_last_modified():
+    modified = await cache.aget(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        await cache.aadd(CATALOG_MODIFIED_KEY, await sync_to_async(catalog_updated_at)(), timeout=None)
+        modified = await cache.aget(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+async def aread_through(key, producer, version=None, timeout=None):
+    """``read_through`` for async views, where ``producer`` is a coroutine function"""
+    if version is None:
+        version = await aget_catalog_version()
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    versioned_key = f'store:catalog:{version}:{key}'
+    previous_key = f'store:catalog:previous:{key}'
+    lock_key = f'{versioned_key}:lock'
+
+    value = await cache.aget(versioned_key)
+    if value is not None:
+        return version, value
+
+    if not await cache.aadd(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        previous = await cache.aget(previous_key)
+        if previous is not None:
+            return previous
+        for _ in range(settings.CATALOG_CACHE_LOCK_POLLS):
+            await asyncio.sleep(settings.CATALOG_CACHE_LOCK_POLL_INTERVAL)
+            value = await cache.aget(versioned_key)
+            if value is not None:
+                return version, value
+        return version, await producer()
+
+    try:
+        value = await producer()
+        if value is not None:
+            await cache.aset_many({versioned_key: value, previous_key: (version, value)}, timeout=timeout)
+    finally:
+        await cache.adelete(lock_key)
+    return version, value
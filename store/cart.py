@@ -0,0 +1,112 @@
+from collections import Counter
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils import timezone
+
+from .cache import get_catalog_version
+from .models import Cart
+from .serializers import CartSummarySerializer
+
+
+def add_to_cart(user_id, items):
+    """
+    Add ``(product_id, quantity)`` pairs to a user's cart in one statement.
+
+    Products already in the cart have their quantity increased in the
+    database, relying on the unique (user, product) constraint, so
+    concurrent adds can neither lose an increment nor create a duplicate
+    row. Returns how many of the products were not in the cart yet.
+    """
+    quantities = Counter()
+    for product_id, quantity in items:
+        quantities[product_id] += quantity
+
+    created_at = Cart._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    params = []
+    for product_id, quantity in quantities.items():
+        params.extend([user_id, product_id, quantity, created_at])
+
+    table = connection.ops.quote_name(Cart._meta.db_table)
+    columns = [
+        connection.ops.quote_name(Cart._meta.get_field(name).column)
+        for name in ('user', 'product', 'quantity', 'created_at')
+    ]
+    quantity = columns[2]
+    sql = 'INSERT INTO {} ({}) VALUES {}'.format(
+        table, ', '.join(columns), ', '.join(['(%s, %s, %s, %s)'] * len(quantities))
+    )
+    if connection.vendor == 'mysql':
+        # The row alias replaces VALUES(), deprecated since MySQL 8.0.20
+        sql += f' AS new ON DUPLICATE KEY UPDATE {quantity} = {quantity} + new.{quantity}'
+    else:
+        sql += (
+            f' ON CONFLICT ({columns[0]}, {columns[1]})'
+            f' DO UPDATE SET {quantity} = {table}.{quantity} + excluded.{quantity}'
+            f' RETURNING {columns[1]}, {quantity}'
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if connection.vendor == 'mysql':
+            # One affected row per insert and two per update, as adding at
+            # least one always changes the quantity
+            inserted = 2 * len(quantities) - cursor.rowcount
+        else:
+            # An updated row ends up with more than was added, unless it had
+            # been left at quantity 0, which counts as not in the cart
+            inserted = sum(1 for product_id, total in cursor.fetchall() if total == quantities[product_id])
+    invalidate_cart_summary(user_id)
+    return inserted
+
+
+def cart_summary_key(user_id):
+    return f'store:cart:summary:{user_id}'
+
+
+def compute_cart_summary(user_id):
+    """Totals of a user's cart per category, from one grouped aggregate"""
+    line_total = ExpressionWrapper(
+        F('quantity') * F('product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    categories = list(
+        Cart.objects.filter(user_id=user_id)
+        .values(category=F('product__category'), category_name=F('product__category__name'))
+        .annotate(line_count=Count('id'), item_count=Sum('quantity'), subtotal=Sum(line_total))
+        .order_by('category_name', 'category')
+    )
+    return {
+        'line_count': sum(row['line_count'] for row in categories),
+        'item_count': sum(row['item_count'] for row in categories),
+        'subtotal': sum((row['subtotal'] for row in categories), Decimal('0')),
+        'categories': categories,
+    }
+
+
+def get_cart_summary(user_id):
+    """
+    The serialized cart summary, cached per user. Cart changes delete the
+    entry, and any catalog change, such as a new price, makes it stale.
+    """
+    version = get_catalog_version()
+    cached = cache.get(cart_summary_key(user_id))
+    if cached is not None and cached['catalog_version'] == version:
+        return cached['summary']
+
+    summary = CartSummarySerializer(compute_cart_summary(user_id)).data
+    cache.set(
+        cart_summary_key(user_id), {'catalog_version': version, 'summary': summary},
+        timeout=settings.CART_SUMMARY_CACHE_TIMEOUT,
+    )
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    # Again once the change commits, in case a read in between cached the old cart
+    cache.delete(cart_summary_key(user_id))
+    transaction.on_commit(partial(cache.delete, cart_summary_key(user_id)))
@@ -0,0 +1,253 @@
+"""
+Bulk create and update of products from a supplier feed, for the
+``products/bulk_upsert/`` endpoint and the ``import_catalog`` command.
+
+Rows are read one at a time from CSV, NDJSON or a JSON list, validated and
+written a batch at a time, each batch in its own transaction, with
+``bulk_create(update_conflicts=True)``: on the primary key for existing
+products, one statement per set of changed fields, and on ``sku`` for new
+ones. A row that fails validation is reported with its number and skipped;
+the rest of its batch is still written.
+
+A row is matched by ``sku`` when it has one, otherwise by ``id``. A row
+with an unknown ``sku`` creates a product, unless it also has the ``id`` of
+an existing product, which is then given that ``sku``. Rows of a batch
+giving the same new ``sku`` to different products are all rejected.
+
+``bulk_create`` sends no signals, so what the product signals do on save
+is done here once per batch: the catalog cache is invalidated, and search
+terms and trend scores follow changed names and categories.
+"""
+import codecs
+import csv
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from rest_framework.exceptions import ValidationError
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductTrendScore
+from .search import index_products
+from .serializers import ProductImportSerializer
+
+REQUIRED_FOR_CREATE = ('name', 'category', 'price', 'image_link')
+
+
+class CatalogImportError(Exception):
+    """The input can't be read at all, as opposed to a bad row"""
+
+
+def read_csv(lines):
+    """``(row number, row)`` pairs of CSV ``lines``, counting the header as row 1"""
+    reader = csv.DictReader(lines)
+    fields = ProductImportSerializer().fields
+    unknown = [name for name in reader.fieldnames or [] if name not in fields]
+    if not reader.fieldnames or unknown:
+        raise CatalogImportError(
+            f"Unknown columns: {', '.join(unknown)}" if unknown else 'The CSV has no header row'
+        )
+    for number, row in enumerate(reader, start=2):
+        # Blank cells leave the field unchanged
+        yield number, {name: value for name, value in row.items() if value not in ('', None)}
+
+
+def read_ndjson(lines):
+    """``(line number, row)`` pairs of NDJSON ``lines``, skipping blank lines"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, f'Invalid JSON: {exc}'
+
+
+def read_rows(stream, input_format):
+    """Rows of a binary ``stream`` of ``csv``, ``ndjson`` or ``json`` input"""
+    if input_format == 'json':
+        try:
+            rows = json.load(stream)
+        except ValueError as exc:
+            raise CatalogImportError(f'Invalid JSON: {exc}')
+        if not isinstance(rows, list):
+            raise CatalogImportError('Expected a JSON list of products')
+        return enumerate(rows, start=1)
+
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    return read_csv(lines) if input_format == 'csv' else read_ndjson(lines)
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=None, dry_run=False, max_errors=None):
+        self.batch_size = batch_size or settings.CATALOG_IMPORT_BATCH_SIZE
+        self.max_errors = settings.CATALOG_IMPORT_MAX_ERRORS if max_errors is None else max_errors
+        self.dry_run = dry_run
+        self.fields = ProductImportSerializer().fields
+        self.rows = self.created = self.updated = self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        batch = []
+        for number, row in rows:
+            batch.append((number, row))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'dry_run': self.dry_run,
+        }
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def validate_row(self, row):
+        """The validated fields of ``row``, or ``None`` and its errors"""
+        if not isinstance(row, dict):
+            return None, {'non_field_errors': [row if isinstance(row, str) else 'Expected an object.']}
+
+        data, errors = {}, {}
+        for name, value in row.items():
+            field = self.fields.get(name)
+            if field is None:
+                errors[name] = ['Unknown field.']
+                continue
+            if value is None:
+                continue
+            try:
+                data[name] = field.run_validation(value)
+            except ValidationError as exc:
+                errors[name] = exc.detail
+        if not errors and 'sku' not in data and 'id' not in data:
+            errors['non_field_errors'] = ['Either sku or id is required.']
+        return (None, errors) if errors else (data, None)
+
+    def import_batch(self, batch):
+        self.rows += len(batch)
+        valid, errors = [], []
+        for number, row in batch:
+            data, row_errors = self.validate_row(row)
+            if row_errors:
+                errors.append((number, row_errors))
+            else:
+                valid.append((number, data))
+
+        skus = {data['sku'] for _, data in valid if 'sku' in data}
+        ids = {data['id'] for _, data in valid if 'id' in data}
+        categories = {data['category'] for _, data in valid if 'category' in data}
+        product_ids_by_sku = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'id'))
+        existing_ids = set(Product.objects.filter(id__in=ids).values_list('id', flat=True))
+        existing_categories = set(Category.objects.filter(id__in=categories).values_list('id', flat=True))
+
+        # Later rows for the same product replace earlier ones in the batch,
+        # as one statement can't change a row twice
+        updates, creates = {}, {}
+        for number, data in valid:
+            if 'category' in data and data['category'] not in existing_categories:
+                errors.append((number, {'category': [f"Invalid category id {data['category']}."]}))
+                continue
+
+            product_id = product_ids_by_sku.get(data.get('sku'))
+            if product_id is not None and data.get('id', product_id) != product_id:
+                errors.append((number, {'sku': ['Already used by another product.']}))
+            elif product_id is not None or data.get('id') in existing_ids:
+                updates[product_id or data['id']] = (number, data)
+            elif 'id' in data:
+                errors.append((number, {'id': [f"No product with id {data['id']}."]}))
+            elif missing := [name for name in REQUIRED_FOR_CREATE if name not in data]:
+                errors.append((number, {name: ['This field is required.'] for name in missing}))
+            else:
+                creates[data['sku']] = (number, data)
+
+        # Rows giving one new sku to different products would break its
+        # unique constraint, and which of them is meant is anyone's guess
+        claims = defaultdict(list)  # New sku -> (rows, key) of each row giving it
+        for rows in (updates, creates):
+            for key, (_, data) in rows.items():
+                if 'sku' in data and data['sku'] not in product_ids_by_sku:
+                    claims[data['sku']].append((rows, key))
+        for claimants in claims.values():
+            if len(claimants) > 1:
+                for rows, key in claimants:
+                    number, _ = rows.pop(key)
+                    errors.append((number, {'sku': ['Also given to another product in this batch.']}))
+
+        if not self.dry_run and (updates or creates):
+            with transaction.atomic():
+                self.write(updates, creates)
+        self.updated += len(updates)
+        self.created += len(creates)
+        for number, row_errors in sorted(errors, key=lambda error: error[0]):
+            self.add_error(number, row_errors)
+
+    def write(self, updates, creates):
+        # Updated products are loaded whole and written back with an upsert
+        # on the primary key, one statement per set of changed fields, which
+        # is far cheaper to build than bulk_update's CASE per row. They are
+        # locked in primary key order, as checkouts lock them.
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=updates).order_by('id')
+        }
+        changed = defaultdict(list)  # Changed fields -> products
+        for product_id, (_, data) in updates.items():
+            fields = {name: value for name, value in data.items() if name != 'id'}
+            changed[frozenset(fields)].append(apply(products[product_id], fields))
+        for fields, group in changed.items():
+            upsert(group, fields, 'id')
+
+        created = defaultdict(list)
+        for _, data in creates.values():
+            created[frozenset(data)].append(apply(Product(), data))
+        for fields, group in created.items():
+            # Updates instead if the sku was added meanwhile
+            upsert(group, fields - {'sku'}, 'sku')
+
+        renamed = {
+            product_id for product_id, (_, data) in updates.items() if {'name', 'category'} & data.keys()
+        }
+        moved = {product_id for product_id, (_, data) in updates.items() if 'category' in data}
+        if creates:
+            renamed |= set(Product.objects.filter(sku__in=creates).values_list('id', flat=True))
+        if renamed:
+            index_products(
+                Product.objects.filter(id__in=renamed).select_related('category').only('id', 'name', 'category__name')
+            )
+        if moved:
+            ProductTrendScore.objects.filter(product_id__in=moved).update(category_id=Subquery(
+                Product.objects.filter(id=OuterRef('product_id')).values('category_id')[:1]
+            ))
+        transaction.on_commit(bump_catalog_version)
+
+
+def apply(product, data):
+    """``product`` with the validated ``data`` of a row set on it"""
+    for name, value in data.items():
+        setattr(product, 'category_id' if name == 'category' else name, value)
+    return product
+
+
+def upsert(products, fields, unique_field):
+    """Insert ``products``, or update ``fields`` of the ones ``unique_field`` matches"""
+    kwargs = {}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = [unique_field]
+    # updated_at is set by bulk_create, as it is by save()
+    Product.objects.bulk_create(
+        products, batch_size=settings.CATALOG_IMPORT_BATCH_SIZE, update_conflicts=True,
+        update_fields=[*fields, 'updated_at'], **kwargs
+    )
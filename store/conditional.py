@@ -0,0 +1,66 @@
+"""
+HTTP validators for catalog responses.
+
+Every response is tagged with an ETag built from the catalog version and
+the URL, and a Last-Modified of the latest catalog change, so a client
+polling an unchanged listing gets a ``304 Not Modified`` worked out from
+the cache alone, before any query or serializer runs.
+"""
+import copy
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def catalog_etag(request, version, renderer_format):
+    key = f'{version}:{renderer_format}:{request.build_absolute_uri()}'
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+class CatalogValidators:
+    def __init__(self, request, version, last_modified, renderer_format='json'):
+        self.request = request
+        self.version = version
+        self.renderer_format = renderer_format
+        self.etag = catalog_etag(request, version, renderer_format)
+        self.last_modified = int(last_modified)
+        # Authenticated requests are left out of shared caches
+        self.public = 'HTTP_AUTHORIZATION' not in request.META
+
+    def for_version(self, version):
+        """
+        The validators for a body built under ``version``. A previous body
+        served during a rebuild gets its own ETag, but no Last-Modified, as
+        when it was built isn't known, and must be revalidated before reuse.
+        """
+        if version == self.version:
+            return self
+        validators = copy.copy(self)
+        validators.version = version
+        validators.etag = catalog_etag(self.request, version, self.renderer_format)
+        validators.last_modified = None
+        return validators
+
+    def not_modified(self, request):
+        """A 304 response if the client's copy is current, otherwise None"""
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        return None if response is None else self.add_headers(response)
+
+    def add_headers(self, response):
+        response.headers.setdefault('ETag', self.etag)
+        if self.last_modified is None:
+            patch_cache_control(response, no_cache=True)
+            return response
+        response.headers.setdefault('Last-Modified', http_date(self.last_modified))
+        if self.public:
+            patch_cache_control(
+                response, public=True, max_age=settings.CATALOG_HTTP_MAX_AGE,
+                s_maxage=settings.CATALOG_HTTP_SHARED_MAX_AGE,
+            )
+        else:
+            patch_cache_control(response, private=True, max_age=settings.CATALOG_HTTP_MAX_AGE)
+        return response
@@ -0,0 +1,158 @@
+"""
+Order exports for finance, as CSV (one row per order item) or NDJSON (one
+order with its items per line). Orders without items have nothing to
+export and are left out.
+
+Rows are read ``EXPORT_CHUNK_SIZE`` at a time, each batch a query that
+continues after the last row of the one before, in ``(order created_at,
+order id, item id)`` order, and written out a chunk at a time. Memory stays
+flat however many orders match, even where the database driver, as
+mysqlclient does, reads a whole result into memory. The same generator
+feeds a ``StreamingHttpResponse`` and the ``export_orders`` task that
+writes large exports to a file.
+"""
+import csv
+import io
+import os
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from config.renderers import FastJSONRenderer
+from .models import OrderItem
+
+CSV_HEADER = (
+    'order_id', 'created_at', 'user_id', 'email', 'status', 'total_amount',
+    'product_id', 'product_name', 'quantity', 'price',
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(start=None, end=None, status=None, chunk_size=None):
+    """
+    ``CSV_HEADER`` tuples of the items of orders created between the
+    ``start`` and ``end`` dates, inclusive, oldest order first
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    items = OrderItem.objects.all()
+    current_timezone = timezone.get_current_timezone()
+    if start:
+        items = items.filter(order__created_at__gte=datetime.combine(start, time.min, current_timezone))
+    if end:
+        end = datetime.combine(end + timedelta(days=1), time.min, current_timezone)
+        items = items.filter(order__created_at__lt=end)
+    if status:
+        items = items.filter(order__status=status)
+    items = items.order_by('order__created_at', 'order_id', 'id').values_list(
+        'id', 'order_id', 'order__created_at', 'order__user_id', 'order__user__email', 'order__status',
+        'order__total_amount', 'product_id', 'product__name', 'quantity', 'price',
+    )
+
+    batch = items[:chunk_size]
+    while True:
+        rows = list(batch)
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        item_id, order_id, created_at = rows[-1][:3]
+        batch = items.filter(
+            Q(order__created_at__gt=created_at)
+            | Q(order__created_at=created_at, order_id__gt=order_id)
+            | Q(order__created_at=created_at, order_id=order_id, id__gt=item_id)
+        )[:chunk_size]
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_chunks(rows, chunk_size=None):
+    """The CSV text, in one string per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch in batched(rows, chunk_size or settings.EXPORT_CHUNK_SIZE):
+        writer.writerows(
+            (order_id, created_at.isoformat(), *rest) for order_id, created_at, *rest in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def order_document(order_rows):
+    order_id, created_at, user_id, email, status, total_amount = order_rows[0][:6]
+    return {
+        'id': order_id,
+        'created_at': created_at,
+        'user': user_id,
+        'email': email,
+        'status': status,
+        'total_amount': str(total_amount),
+        'items': [
+            {'product': product_id, 'product_name': name, 'quantity': quantity, 'price': str(price)}
+            for *_, product_id, name, quantity, price in order_rows
+        ],
+    }
+
+
+def ndjson_chunks(rows, chunk_size=None):
+    """One JSON document per order and line, in one string per chunk of orders"""
+    renderer = FastJSONRenderer()
+    orders = (list(order_rows) for _, order_rows in groupby(rows, key=lambda row: row[0]))
+    for batch in batched(orders, chunk_size or settings.EXPORT_CHUNK_SIZE):
+        yield b''.join(renderer.render(order_document(order_rows)) + b'\n' for order_rows in batch).decode()
+
+
+EXPORT_WRITERS = {'csv': csv_chunks, 'ndjson': ndjson_chunks}
+
+
+def export_chunks(output, **filters):
+    return EXPORT_WRITERS[output](export_rows(**filters))
+
+
+async def async_chunks(chunks):
+    """
+    ``chunks`` for a response served over ASGI, which would otherwise read
+    a synchronous iterator whole before sending it. Each chunk is read on
+    the thread owning the database connection the cursor belongs to.
+    """
+    read = sync_to_async(next, thread_sensitive=True)
+    chunks = iter(chunks)
+    while (chunk := await read(chunks, None)) is not None:
+        yield chunk
+
+
+def export_path(name):
+    return os.path.join(settings.EXPORT_DIR, name)
+
+
+def write_export(name, output, **filters):
+    """
+    Write an export to ``EXPORT_DIR``. It is written under a ``.part`` name
+    and renamed when complete, so a partial file is never served.
+    """
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    path = export_path(name)
+    with open(f'{path}.part', 'w', encoding='utf-8', newline='') as f:
+        for chunk in export_chunks(output, **filters):
+            f.write(chunk)
+    os.replace(f'{path}.part', path)
+    return path
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from rest_framework import serializers
+
+from store.tasks import send_low_stock_alert
+from .models import Product
+from .outbox import enqueue_task
+
+
+class _InsufficientStock(Exception):
+    pass
+
+
+def reserve_stock(items):
+    """
+    Take the ordered quantities out of stock or reject the whole order.
+
+    All products are decremented by one conditional statement,
+    ``UPDATE ... SET quantity = quantity - n WHERE id IN (...) AND
+    quantity >= n``, so two checkouts can never sell the same unit. Only
+    the rows being bought are locked, in primary key order, so orders for
+    different products don't wait on each other and orders sharing
+    products can't deadlock.
+
+    Must run inside the transaction that creates the order. A rejected
+    reservation leaves stock untouched and raises ``ValidationError``.
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['product'].id] += item['quantity']
+    if not quantities:
+        return
+
+    ordered = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()]
+    )
+
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(
+                pk__in=quantities,
+                quantity__gte=ordered
+            ).update(quantity=F('quantity') - ordered)
+            if updated != len(quantities):
+                raise _InsufficientStock
+    except _InsufficientStock:
+        stock = Product.objects.filter(pk__in=quantities).values_list('id', 'quantity')
+        shortages = sorted(
+            product_id for product_id, quantity in stock if quantity < quantities[product_id]
+        )
+        raise serializers.ValidationError({
+            'items': [f"Insufficient stock for product ids: {', '.join(map(str, shortages))}"]
+        })
+
+    threshold = settings.LOW_STOCK_THRESHOLD
+    remaining = Product.objects.filter(pk__in=quantities).values_list('id', 'quantity')
+    for product_id, quantity in remaining:
+        # Alert only when this order takes the product across the threshold,
+        # not on every order once it is already low
+        if quantity <= threshold < quantity + quantities[product_id]:
+            # Through the outbox, so a broker outage can't hold up or fail
+            # a checkout that has already committed
+            enqueue_task(send_low_stock_alert.name, product_id)
@@ -0,0 +1,163 @@
+import json
+import platform
+import random
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+
+from config import perf
+from store.benchmark import DEFAULT_SIZES, SCENARIOS, Dataset, percentile
+
+# Isolated cache, so responses for the rolled back rows never reach a
+# cache shared with other processes
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark-api'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset, drive every store and account endpoint '
+        'through the test client and report throughput, latency percentiles '
+        'and queries per request. Runs inside a transaction that is rolled '
+        'back. Save a report with --output and compare later runs against it '
+        'with --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_SIZES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario first')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--scenario', action='append', help='Only run scenarios starting with this')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a report written with --output')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Fraction by which p95 latency may exceed the baseline',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in DEFAULT_SIZES}
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['scenario'] or scenario[0].startswith(tuple(options['scenario']))
+        ]
+        if not scenarios:
+            raise CommandError('No scenario matches --scenario')
+
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES=BENCHMARK_CACHES,
+            PERF_SAMPLE_RATE=0,  # Queries are counted by the command itself
+        )
+        with overrides, transaction.atomic():
+            rng = random.Random(options['seed'])
+            self.stdout.write(f'Seeding {sizes}...')
+            data = Dataset(rng, sizes)
+            results = {
+                name: self.run_scenario(data, rng, method, role, build, options)
+                for name, method, role, build in scenarios
+            }
+            transaction.set_rollback(True)
+
+        report = {
+            'environment': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'sizes': sizes,
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        self.print_report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(baseline, report, options['tolerance'])
+            for message in regressions:
+                self.stdout.write(self.style.WARNING(f'REGRESSION {message}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s) against the baseline')
+
+    def run_scenario(self, data, rng, method, role, build, options):
+        client = Client()
+        latencies, queries, statuses = [], 0, {}
+        perf.instrument_connections()
+
+        for i in range(options['warmup'] + options['requests']):
+            user = data.admin if role == 'admin' else rng.choice(data.customers)
+            url, body = build(data, rng, user)
+            kwargs = {'content_type': 'application/json', 'data': json.dumps(body)} if body else {}
+            if role != 'anonymous':
+                kwargs['headers'] = {'authorization': f'Bearer {data.access_token(user)}'}
+
+            profile, token = perf.start_profile()
+            try:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, **kwargs)
+                elapsed = time.perf_counter() - started
+            finally:
+                perf.end_profile(token)
+
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {url} returned {response.status_code}: {response.content[:200]}'
+                )
+            if i >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                queries += len(profile.queries)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        return {
+            'throughput': round(len(latencies) / (sum(latencies) / 1000), 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_per_request': round(queries / len(latencies), 2),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
+
+    def print_report(self, results):
+        self.stdout.write(
+            f"{'scenario':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24} {result['throughput']:>8.1f} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries_per_request']:>8.2f}"
+            )
+
+
+def compare(baseline, report, tolerance):
+    """Scenarios that got slower than ``tolerance`` allows or run more queries"""
+    regressions = []
+    if baseline.get('sizes') != report['sizes']:
+        regressions.append('dataset sizes differ from the baseline, results are not comparable')
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result['queries_per_request'] > before['queries_per_request']:
+            regressions.append(
+                f"{name}: queries per request {before['queries_per_request']} -> {result['queries_per_request']}"
+            )
+    return regressions
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from store.benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare latency under many slow clients for the sync views behind a '
+        'fixed pool of WSGI worker threads and the async views on one event '
+        'loop. Each client holds its connection open for --client-delay '
+        'seconds, as a slow mobile network would.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/store/products/')
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads')
+        parser.add_argument('--client-delay', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        url, clients, delay = options['url'], options['clients'], options['client_delay']
+
+        # The test clients always send the host 'testserver'
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            results = {
+                'wsgi': self.run_wsgi(url, clients, delay, options['threads']),
+                'asgi': async_to_sync(self.run_asgi)(url, clients, delay),
+            }
+        for label, (latencies, peak) in results.items():
+            self.stdout.write(
+                f'{label}: p50 {percentile(latencies, 50) * 1000:8.1f} ms  '
+                f'p99 {percentile(latencies, 99) * 1000:8.1f} ms  '
+                f'peak concurrency {peak}'
+            )
+
+    def run_wsgi(self, url, clients, delay, threads):
+        in_flight = peak = 0
+        started = time.perf_counter()
+
+        def request(_):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                # A worker is tied up for as long as the client is connected
+                time.sleep(delay)
+                self.check_response(Client().get(url))
+            finally:
+                in_flight -= 1
+                connections.close_all()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(request, range(clients))), peak
+
+    async def run_asgi(self, url, clients, delay):
+        in_flight = peak = 0
+        started = time.perf_counter()
+        client = AsyncClient()
+
+        async def request():
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(delay)
+                self.check_response(await client.get(url))
+            finally:
+                in_flight -= 1
+            return time.perf_counter() - started
+
+        latencies = await asyncio.gather(*(request() for _ in range(clients)))
+        return latencies, peak
+
+    def check_response(self, response):
+        if response.status_code >= 500:
+            raise CommandError(f'Request failed with {response.status_code}')
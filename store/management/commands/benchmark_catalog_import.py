@@ -0,0 +1,90 @@
+import io
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from account.models import User
+from account.serializers import CustomTokenObtainPairSerializer
+from store.catalog_import import CatalogImporter, read_csv
+from store.management.commands.benchmark_api import BENCHMARK_CACHES
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare updating prices and quantities one PATCH request per product '
+        'with the bulk_upsert endpoint and the import_catalog code path, on a '
+        'synthetic catalog. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Products updated by the bulk paths')
+        parser.add_argument('--requests', type=int, default=500, help='Products updated one request each')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES=BENCHMARK_CACHES,
+            PERF_SAMPLE_RATE=0,
+        )
+        with overrides, transaction.atomic():
+            rng = random.Random(options['seed'])
+            rows = options['rows']
+            self.stdout.write(f'Seeding {rows} products...')
+            category = Category.objects.create(name='Benchmark')
+            Product.objects.bulk_create(
+                (
+                    Product(
+                        sku=f'BENCH-{i}', name=f'Product {i}', category=category, price=Decimal('9.99'),
+                        image_link='https://example.com/product.jpg', quantity=10,
+                    )
+                    for i in range(rows)
+                ),
+                batch_size=2000,
+            )
+            product_ids = list(Product.objects.filter(category=category).values_list('id', flat=True))
+            admin = User.objects.create_user(email='bench-admin@example.com', password='x', is_staff=True)
+            client = Client(headers={
+                'authorization': f'Bearer {CustomTokenObtainPairSerializer.get_token(admin).access_token}',
+            })
+
+            def feed():
+                lines = ''.join(
+                    f'BENCH-{i},{rng.randint(100, 9999) / 100:.2f},{rng.randint(0, 500)}\n' for i in range(rows)
+                )
+                return 'sku,price,quantity\n' + lines
+
+            started = time.perf_counter()
+            for product_id in product_ids[:options['requests']]:
+                response = client.patch(
+                    f'/api/store/products/{product_id}/',
+                    data=json.dumps({'price': f'{rng.randint(100, 9999) / 100:.2f}', 'quantity': rng.randint(0, 500)}),
+                    content_type='application/json',
+                )
+                assert response.status_code == 200, response.content
+            per_request = min(options['requests'], rows) / (time.perf_counter() - started)
+
+            body = feed().encode()
+            started = time.perf_counter()
+            response = client.generic('POST', '/api/store/products/bulk_upsert/', body, content_type='text/csv')
+            assert response.status_code == 200 and not response.json()['error_count'], response.content
+            endpoint = rows / (time.perf_counter() - started)
+
+            lines = io.StringIO(feed())
+            started = time.perf_counter()
+            CatalogImporter(batch_size=options['batch_size']).run(read_csv(lines))
+            command = rows / (time.perf_counter() - started)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"PATCH per product":>20}: {per_request:9.0f} rows/s')
+        self.stdout.write(f'{"bulk_upsert":>20}: {endpoint:9.0f} rows/s  ({endpoint / per_request:.0f}x)')
+        self.stdout.write(f'{"import_catalog":>20}: {command:9.0f} rows/s  ({command / per_request:.0f}x)')
@@ -0,0 +1,107 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from account.models import User
+from account.serializers import CustomTokenObtainPairSerializer
+from store.management.commands.benchmark_api import BENCHMARK_CACHES
+from store.models import Category, OutboxEvent, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure checkout throughput with concurrent clients, all buying one '
+        'hot product and then each buying from a spread of products. Seeds '
+        'its own products and users, which need committing so the client '
+        'threads see them, and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=50, help='Orders placed per thread and scenario')
+        parser.add_argument('--products', type=int, default=200, help='Products of the spread scenario')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        connection.ensure_connection()
+        if connection.vendor == 'sqlite' and (
+            connection.is_in_memory_db() or connection.transaction_mode != 'IMMEDIATE'
+        ):
+            raise CommandError("SQLite needs a file database in IMMEDIATE transaction mode")
+
+        threads, orders = options['threads'], options['orders']
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES=BENCHMARK_CACHES,
+            PERF_SAMPLE_RATE=0,
+        )
+        first_event_id = (OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        category = Category.objects.create(name='Checkout benchmark')
+        users = [
+            User.objects.create_user(email=f'bench-checkout{i}@example.com', password='x')
+            for i in range(threads)
+        ]
+        try:
+            hot = Product.objects.create(
+                name='Hot product', category=category, price=Decimal('9.99'),
+                image_link='https://example.com/product.jpg', quantity=threads * orders,
+            )
+            spread = [
+                product.id for product in Product.objects.bulk_create(
+                    Product(
+                        name=f'Product {i}', category=category, price=Decimal('9.99'),
+                        image_link='https://example.com/product.jpg', quantity=threads * orders,
+                    )
+                    for i in range(options['products'])
+                )
+            ]
+            if spread and spread[0] is None:
+                spread = list(
+                    Product.objects.filter(category=category).exclude(id=hot.id).values_list('id', flat=True)
+                )
+            rng = random.Random(options['seed'])
+
+            # Outbox events aren't relayed, only deleted afterwards, so the
+            # broker doesn't count towards checkout time
+            with overrides, mock.patch('store.outbox.schedule_relay'):
+                for label, pick in (('hot product', lambda: hot.id), ('spread', lambda: rng.choice(spread))):
+                    rate, statuses = self.run(users, orders, pick)
+                    rejected = len(statuses) - statuses.count(201)
+                    self.stdout.write(f'{label:>12}: {rate:8.1f} orders/s  ({rejected} rejected)')
+        finally:
+            OutboxEvent.objects.filter(id__gte=first_event_id).delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+            category.delete()
+
+    def run(self, users, orders, pick):
+        statuses = []
+
+        def buy(user):
+            client = Client(headers={
+                'authorization': f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}',
+            })
+            try:
+                for _ in range(orders):
+                    response = client.post(
+                        '/api/store/orders/',
+                        data=json.dumps({'items': [{'product': pick(), 'quantity': 1}]}),
+                        content_type='application/json',
+                    )
+                    if response.status_code >= 500:
+                        raise CommandError(f'Checkout returned {response.status_code}')
+                    statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as executor:
+            list(executor.map(buy, users))
+        return len(statuses) / (time.perf_counter() - started), statuses
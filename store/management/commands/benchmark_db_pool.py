@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+
+from config.mysql_pool import pool
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure requests per second against an endpoint with the MySQL '
+        'connection pool disabled and then enabled'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/api/store/products/?category=1')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if not connection.settings_dict['ENGINE'].startswith('config.mysql_pool'):
+            raise CommandError("The default database doesn't use the config.mysql_pool engine")
+
+        results = {}
+        for label, enabled in (('without pool', False), ('with pool', True)):
+            pool.set_enabled(enabled)
+            connections.close_all()
+            results[label] = self.run(options['url'], options['requests'], options['threads'])
+
+        for label, rps in results.items():
+            self.stdout.write(f'{label:>12}: {rps:8.1f} requests/s')
+        self.stdout.write(str(pool.pool_stats()))
+
+    def run(self, url, requests, threads):
+        per_thread = requests // threads
+
+        def worker(_):
+            client = Client(HTTP_HOST='localhost')
+            try:
+                for _ in range(per_thread):
+                    response = client.get(url)
+                    if response.status_code >= 500:
+                        raise CommandError(f'{url} returned {response.status_code}')
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+        return per_thread * threads / (time.perf_counter() - started)
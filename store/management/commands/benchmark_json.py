@@ -0,0 +1,47 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from config.renderers import FastJSONRenderer, orjson
+from store.models import Category, Product
+from store.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Time serializing and rendering a page of products with '
+        'ProductSerializer, using the stdlib and the orjson JSON renderers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, both renderers use json'))
+
+        # Unsaved instances, so only serialization is measured
+        category = Category(id=1, name='Groceries')
+        now = timezone.now()
+        products = [
+            Product(
+                id=i, name=f'Product {i}', category=category, price=Decimal('9.99'),
+                image_link='https://example.com/product.jpg', created_at=now,
+                is_trending=i % 7 == 0,
+            )
+            for i in range(options['products'])
+        ]
+        data = {'next': None, 'previous': None, 'results': ProductSerializer(products, many=True).data}
+
+        timings = {
+            'serializer': lambda: ProductSerializer(products, many=True).data,
+            'render json': lambda: JSONRenderer().render(data),
+            'render orjson': lambda: FastJSONRenderer().render(data),
+        }
+        for label, func in timings.items():
+            seconds = min(timeit.repeat(func, number=1, repeat=options['repeat']))
+            self.stdout.write(f'{label:>13}: {seconds * 1000:7.2f} ms')
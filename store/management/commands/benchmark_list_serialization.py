@@ -0,0 +1,86 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from account.models import User
+from store.models import Cart, Category, Order, OrderItem, Product
+from store.views import CartViewSet, OrderViewSet, ProductViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the list serializers with the .values() projections used by '
+        'the list endpoints on a synthetic catalog. Runs inside a transaction '
+        'that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['rows'])
+
+            for viewset_class in (ProductViewSet, CartViewSet, OrderViewSet):
+                view = viewset_class()
+                view.action = 'list'
+                queryset = view.eager_load(view.get_serializer_class().Meta.model.objects.all())
+                projection = view.get_values_projection()
+
+                serializer = self.best_time(
+                    lambda: view.get_serializer_class()(queryset.all(), many=True).data,
+                    options['repeat'],
+                )
+                values = self.best_time(
+                    lambda: projection.represent(projection.values(queryset)),
+                    options['repeat'],
+                )
+                rows = options['rows']
+                self.stdout.write(
+                    f'{viewset_class.__name__:>14}: serializer {rows / serializer:9.0f} rows/s  '
+                    f'values {rows / values:9.0f} rows/s  ({serializer / values:.1f}x)'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        self.stdout.write(f'Seeding {count} products, cart items and orders...')
+        user = User.objects.create_user(email='benchmark@example.com', password='benchmark')
+        category = Category.objects.create(name='Benchmark')
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f'Product {i}', category=category, price=Decimal(i % 10000) / 100,
+                    image_link='https://example.com/product.jpg',
+                )
+                for i in range(count)
+            ),
+            batch_size=2000,
+        )
+        product_ids = list(Product.objects.filter(category=category).values_list('id', flat=True))
+        Cart.objects.bulk_create(
+            (Cart(user=user, product_id=product_id, quantity=2) for product_id in product_ids),
+            batch_size=2000,
+        )
+        Order.objects.bulk_create(
+            (Order(user=user, total_amount=Decimal('19.98')) for _ in range(count)),
+            batch_size=2000,
+        )
+        order_ids = Order.objects.filter(user=user).values_list('id', flat=True)
+        OrderItem.objects.bulk_create(
+            (
+                OrderItem(order_id=order_id, product_id=product_ids[0], quantity=2, price=Decimal('9.99'))
+                for order_id in order_ids
+            ),
+            batch_size=2000,
+        )
+
+    def best_time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Category, Product
+from store.search import filter_products, ranked_products, rebuild_index
+
+SYLLABLES = (
+    'ba', 'ko', 'ri', 'sen', 'ta', 'lo', 'mi', 'zu', 'pe', 'dra',
+    'vel', 'nox', 'qui', 'far', 'tem', 'sol', 'ar', 'gen', 'lux', 'ion',
+)
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare name__icontains against the search index on a synthetic '
+        'catalog. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--vocabulary', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = make_vocabulary(rng, options['vocabulary'])
+        # Whole words and typed-so-far prefixes, as the storefront sends them
+        queries = [
+            ' '.join(rng.sample(vocabulary, rng.choice((1, 2))))[:rng.choice((4, 6, 40))]
+            for _ in range(options['queries'])
+        ]
+
+        with transaction.atomic():
+            self.seed(rng, vocabulary, options['products'])
+
+            # Same ordering and page size as the product listing
+            base = Product.objects.order_by('-created_at', '-id')
+            results = {
+                'icontains': self.time_queries(
+                    queries, lambda q: list(base.filter(name__icontains=q)[:50].values_list('id'))
+                ),
+                'index filter': self.time_queries(
+                    queries, lambda q: list(filter_products(base, q)[:50].values_list('id'))
+                ),
+                'index ranked': self.time_queries(
+                    queries, lambda q: ranked_products(base, q, 50)
+                ),
+            }
+            transaction.set_rollback(True)
+
+        for label, timings in results.items():
+            timings.sort()
+            self.stdout.write(
+                f'{label:>13}: median {statistics.median(timings):7.2f} ms  '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:7.2f} ms'
+            )
+
+    def seed(self, rng, vocabulary, count):
+        self.stdout.write(f'Seeding {count} products...')
+        categories = Category.objects.bulk_create(
+            Category(name=f'{word.title()} goods') for word in rng.sample(vocabulary, 20)
+        )
+        if not categories[0].pk:
+            categories = list(Category.objects.order_by('-id')[:len(categories)])
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=' '.join(rng.sample(vocabulary, 3)).title(),
+                    category=rng.choice(categories),
+                    price=rng.randint(100, 10000) / 100,
+                    image_link='https://example.com/product.jpg',
+                )
+                for _ in range(count)
+            ),
+            batch_size=2000,
+        )
+        rebuild_index()
+
+    def time_queries(self, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
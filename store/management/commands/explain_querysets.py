@@ -0,0 +1,105 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.pagination import CursorPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from account.models import User
+from store.urls import router
+
+# Query parameters each listing is commonly called with, by route basename
+SAMPLE_PARAMS = {
+    'product': [{}, {'category': '1'}, {'is_trending': 'true'}, {'name': 'apple'}],
+}
+
+# Small lookup tables that are always returned whole
+ALLOWED_FULL_SCANS = {'store_category'}
+
+_SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)')
+_POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+
+
+def find_full_scans(plan, vendor):
+    """Tables read with a full scan according to an EXPLAIN ``plan``"""
+    if vendor == 'mysql':
+        tables = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    tables.append(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(plan))
+        return tables
+    if vendor == 'postgresql':
+        return _POSTGRES_SCAN_RE.findall(plan)
+    return _SQLITE_SCAN_RE.findall(plan)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the list queryset of every store viewset and flag full "
+        "table scans. Run it against a database with realistic data, as query "
+        "planners happily scan tiny tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help='Exit with an error if any query does a full table scan',
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {'format': 'JSON'} if connection.vendor == 'mysql' else {}
+        flagged = []
+
+        for label, queryset in self.list_querysets():
+            plan = queryset.explain(**explain_options)
+            scans = [
+                table for table in find_full_scans(plan, connection.vendor)
+                if table not in ALLOWED_FULL_SCANS
+            ]
+            if scans:
+                flagged.append(label)
+                self.stdout.write(self.style.WARNING(f"FULL SCAN {label}: {', '.join(scans)}"))
+            else:
+                self.stdout.write(f'ok        {label}')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{len(flagged)} queryset(s) do full table scans')
+
+    def list_querysets(self):
+        factory = APIRequestFactory()
+        users = [
+            ('customer', User(id=1, email='customer@example.com')),
+            ('staff', User(id=1, email='staff@example.com', is_staff=True)),
+        ]
+
+        for prefix, viewset_class, basename in router.registry:
+            if not hasattr(viewset_class, 'get_queryset'):
+                continue
+            for params in SAMPLE_PARAMS.get(basename, [{}]):
+                for role, user in users:
+                    request = Request(factory.get(f'/{prefix}/', params))
+                    request.user = user
+                    view = viewset_class(request=request, action='list', format_kwarg=None, kwargs={})
+                    queryset = view.filter_queryset(view.get_queryset())
+
+                    # Explain the page query the paginator would actually run
+                    paginator = view.paginator
+                    if isinstance(paginator, CursorPagination):
+                        page_size = paginator.get_page_size(request) or 0
+                        queryset = queryset.order_by(*paginator.ordering)[:page_size + 1]
+
+                    query = '&'.join(f'{key}={value}' for key, value in params.items())
+                    yield f"{basename} as {role}{' ?' + query if query else ''}", queryset
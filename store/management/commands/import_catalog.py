@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_import import CatalogImportError, CatalogImporter, read_rows
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'json'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Create or update products from a CSV, NDJSON or JSON file ("-" for '
+        'stdin), matching rows by sku, else id. Rows are written in batches, '
+        'one transaction each, and rows that fail validation are reported '
+        'and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the rows')
+        parser.add_argument('--max-errors', type=int, default=100, help='Row errors to print')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if input_format is None:
+            raise CommandError('Pass --format, it cannot be told from the file name')
+
+        importer = CatalogImporter(options['batch_size'], options['dry_run'], options['max_errors'])
+        started = time.perf_counter()
+        try:
+            if path == '-':
+                importer.run(read_rows(sys.stdin.buffer, input_format))
+            else:
+                with open(path, 'rb') as f:
+                    importer.run(read_rows(f, input_format))
+        except (CatalogImportError, OSError) as exc:
+            raise CommandError(exc)
+        elapsed = time.perf_counter() - started
+
+        for error in importer.errors:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        summary = (
+            f"{'Checked' if importer.dry_run else 'Imported'} {importer.rows} rows in {elapsed:.1f}s "
+            f"({importer.rows / max(elapsed, 1e-9):.0f} rows/s): {importer.created} created, "
+            f"{importer.updated} updated, {importer.error_count} failed"
+        )
+        style = self.style.WARNING if importer.error_count else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import rebuild_sales_rollups, snapshot_stock
+from store.models import DailyCategorySales, DailyProductSales, DailySales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from every order and snapshot the stock on hand'
+
+    def handle(self, *args, **options):
+        rebuild_sales_rollups()
+        snapshot_stock()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {DailySales.objects.count()} daily, {DailyProductSales.objects.count()} product and '
+            f'{DailyCategorySales.objects.count()} category daily rollups'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import ProductSearchTerm
+from store.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from product and category names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {ProductSearchTerm.objects.count()} search terms'
+        ))
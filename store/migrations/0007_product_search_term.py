@@ -0,0 +1,63 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:21
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A copy of store.search.term_weights as of this migration, so later
+# changes to the index don't change what it does
+WORD_RE = re.compile(r'\w+')
+
+
+def term_weights(name, category_name):
+    weights = {}
+    for text, weight in ((category_name, 1), (name, 3)):
+        words = (word[:50] for word in WORD_RE.findall(text.lower()))
+        for word in dict.fromkeys(words):
+            for length in range(2, len(word)):
+                prefix = word[:length]
+                weights[prefix] = max(weights.get(prefix, 0), weight)
+            weights[word] = max(weights.get(word, 0), weight * 2)
+    return weights
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSearchTerm = apps.get_model('store', 'ProductSearchTerm')
+
+    batch = []
+    for product in Product.objects.select_related('category').iterator(chunk_size=2000):
+        weights = term_weights(product.name, product.category.name)
+        batch.extend(
+            ProductSearchTerm(product_id=product.id, term=term, weight=weight)
+            for term, weight in weights.items()
+        )
+        if len(batch) >= 2000:
+            ProductSearchTerm.objects.bulk_create(batch)
+            batch = []
+    ProductSearchTerm.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='search_term_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'term'), name='unique_product_search_term')],
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
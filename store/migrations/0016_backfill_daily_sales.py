@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_sales(apps, schema_editor):
+    """
+    Fill ``DailySales`` for the days compacted before it existed. Units and
+    revenue are those already in the category rollups, as the pending deltas
+    still get folded in. Orders are counted from the orders table, less the
+    pending ``day_orders``, as deltas from before ``day_orders`` existed
+    carry none.
+    """
+    DailySales = apps.get_model('store', 'DailySales')
+    DailyCategorySales = apps.get_model('store', 'DailyCategorySales')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    SalesDelta = apps.get_model('store', 'SalesDelta')
+
+    days = {}
+    for row in DailyCategorySales.objects.values('date').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by():
+        days[row['date']] = DailySales(date=row['date'], units=row['units'], revenue=row['revenue'])
+    orders = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .annotate(date=TruncDate('order__created_at')).values('date')
+        .annotate(orders=Count('order_id', distinct=True)).order_by()
+    )
+    for row in orders:
+        days.setdefault(row['date'], DailySales(date=row['date'])).orders += row['orders']
+    for row in SalesDelta.objects.values('date').annotate(orders=Sum('day_orders')).order_by():
+        days.setdefault(row['date'], DailySales(date=row['date'])).orders -= row['orders']
+
+    DailySales.objects.all().delete()
+    DailySales.objects.bulk_create(days.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_daily_sales'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
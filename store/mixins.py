@@ -0,0 +1,107 @@
+from rest_framework.response import Response
+
+from .cache import get_catalog_last_modified, get_catalog_version, read_through
+from .conditional import CatalogValidators
+from .projections import ValuesProjection
+
+
+class EagerLoadingMixin:
+    """
+    Lets a viewset declare the relations its serializer touches so the
+    queryset loads them up front instead of once per row. ``only_fields``
+    applies to ``read_actions`` alone: a save of an instance loaded with
+    ``only()`` writes just the loaded fields, and would skip ``auto_now``.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    only_fields = ()
+    read_actions = ('list', 'retrieve')
+
+    def eager_load(self, queryset):
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        if self.only_fields and getattr(self, 'action', None) in self.read_actions:
+            queryset = queryset.only(*self.only_fields)
+        return queryset
+
+
+class ValuesListMixin:
+    """
+    Serves ``list`` from ``.values()`` rows shaped like the serializer's
+    output by a ``ValuesProjection``, instead of building model instances
+    and serializing them field by field. ``values_expressions`` annotates
+    anything the serializer reads that isn't a model field.
+    """
+    values_expressions = {}
+
+    def get_values_projection(self):
+        viewset_class = type(self)
+        if '_values_projection' not in viewset_class.__dict__:
+            viewset_class._values_projection = ValuesProjection(
+                self.get_serializer_class(), self.values_expressions
+            )
+        return viewset_class._values_projection
+
+    def list(self, request, *args, **kwargs):
+        projection = self.get_values_projection()
+        queryset = projection.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.represent(page))
+        return Response(projection.represent(queryset))
+
+
+class CatalogCacheMixin:
+    """
+    Serves ``list`` and ``retrieve`` from the versioned catalog cache, with
+    ETag and Last-Modified validators so unchanged responses become 304s.
+    Any save or delete of a category or product invalidates every entry.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def is_cacheable(self, request):
+        return request.method == 'GET' and self.action in self.cached_actions
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        # Taken before the response is built, and the cache is read under
+        # it, so a change made meanwhile can only make the next request miss
+        validators = CatalogValidators(
+            request, get_catalog_version(), get_catalog_last_modified(),
+            request.accepted_renderer.format,
+        )
+        response = validators.not_modified(request)
+        if response is not None:
+            return response
+
+        version, response = self.cached_response(validators.version, view, request, *args, **kwargs)
+        if response.status_code == 200:
+            validators.for_version(version).add_headers(response)
+        return response
+
+    def cached_response(self, version, view, request, *args, **kwargs):
+        """The response with the catalog version its body was built under"""
+        if not self.is_cacheable(request):
+            return version, view(request, *args, **kwargs)
+
+        response = None
+
+        def render():
+            nonlocal response
+            response = view(request, *args, **kwargs)
+            return response.data if response.status_code == 200 else None
+
+        # The absolute URI keeps the host and query string in the key, as
+        # both end up in the body through pagination links
+        version, data = read_through(request.build_absolute_uri(), render, version)
+        if response is not None:
+            return version, response
+        return version, Response(data)
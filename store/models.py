@@ -1,9 +1,61 @@
 from django.db import models
 from account.models import User
 
-class Category(models.Model):
+
+class TracksSavedValues:
+    """
+    Remembers the ``tracked_fields`` attribute values an instance was read
+    or last saved with, so signal receivers can skip work a save doesn't
+    need, e.g. reindexing a product whose price changed.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_saved_values()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_values(kwargs.get('fields'))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_saved_values(kwargs.get('update_fields'))
+
+    def remember_saved_values(self, update_fields=None):
+        saved = getattr(self, '_saved_values', {})
+        for attname in self.tracked_fields:
+            # Deferred fields that were never set are left out
+            if attname in self.__dict__ and self.is_saved_field(attname, update_fields):
+                saved[attname] = self.__dict__[attname]
+        self._saved_values = saved
+
+    def is_saved_field(self, attname, update_fields):
+        return update_fields is None or bool({attname, self._meta.get_field(attname).name} & set(update_fields))
+
+    def has_changed(self, *attnames, update_fields=None):
+        """
+        Whether any of ``attnames`` differs from its value in the database.
+        Pass the ``update_fields`` of a save to ignore the fields it left out.
+        """
+        saved = getattr(self, '_saved_values', None)
+        if saved is None:
+            return True
+        return any(
+            attname in self.__dict__ and self.is_saved_field(attname, update_fields)
+            and self.__dict__[attname] != saved.get(attname, models.DEFERRED)
+            for attname in attnames
+        )
+
+
+class Category(TracksSavedValues, models.Model):
+    tracked_fields = ('name',)
+
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     image_link = models.URLField(default="https://example.com/default-image.jpg")
    
     def __str__(self):
@@ -12,18 +64,81 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
 
-class Product(models.Model):
+class Product(TracksSavedValues, models.Model):
+    tracked_fields = ('name', 'category_id')
+
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # Supplier's key, matched by catalog imports
     name = models.CharField(max_length=200)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image_link = models.URLField()
     quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_trending = models.BooleanField(default=False)
 
     def __str__(self):
         return self.name
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='product_cat_created_id_idx'),
+            models.Index(fields=['is_trending', 'created_at', 'id'], name='product_trend_created_id_idx'),
+        ]
+
+class ProductTrendScore(models.Model):
+    """
+    Time-decayed sales score of a product that sold recently, kept by
+    ``store.trending``. Products whose score decays away are removed.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='trend_score')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')  # Copied from the product
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trend_score_idx'),
+            models.Index(fields=['category', '-score'], name='trend_category_score_idx'),
+        ]
+
+class TrendingState(models.Model):
+    """Single row: how far order items have been folded into the trend scores"""
+    last_order_item_id = models.BigIntegerField(default=0)
+    computed_at = models.DateTimeField(null=True, blank=True)
+
+class LowStockAlert(models.Model):
+    """A low stock alert waiting for, or included in, an admin digest"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_alerts')
+    quantity = models.PositiveIntegerField()  # Stock when the alert was raised
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Low stock - {self.product_id} ({self.quantity})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'id'], name='low_stock_alert_sent_idx'),
+        ]
+
+class ProductSearchTerm(models.Model):
+    """One word of a product's name or category, for prefix search"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=50)
+    weight = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'term'], name='unique_product_search_term'),
+        ]
+        indexes = [
+            models.Index(fields=['term', 'product'], name='search_term_product_idx'),
+        ]
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -37,6 +152,14 @@ class Cart(models.Model):
     def total_price(self):
         return self.quantity * self.product.price
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_user_product'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='cart_user_created_id_idx'),
+        ]
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -54,6 +177,12 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.id} - {self.user.email}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_id_idx'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -61,4 +190,86 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Store price at time of purchase
 
     def __str__(self):
-        return f"{self.order.id} - {self.product.name} x {self.quantity}"
\ No newline at end of file
+        return f"{self.order.id} - {self.product.name} x {self.quantity}"
+
+class OutboxEvent(models.Model):
+    """A Celery task recorded in the same transaction as the change that triggers it"""
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['published_at', 'id'], name='outbox_published_idx'),
+        ]
+
+class SalesDelta(models.Model):
+    """
+    Sales of one product in one order, or their reversal when negative,
+    waiting to be compacted into the daily rollups by ``store.analytics``
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField()  # Orders counted for the category: 1 on one row per order and category, else 0
+    day_orders = models.IntegerField(default=0)  # Orders counted for the day: 1 on one row per order, else 0
+    units = models.IntegerField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='sales_delta_date_idx'),
+        ]
+
+class DailySales(models.Model):
+    """Sales of one day across categories, each order counted once"""
+    date = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')  # At the time of sale
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales'),
+        ]
+
+class DailyStock(models.Model):
+    """Stock on hand of a category, as of the last compaction of the day"""
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    products = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_stock'),
+        ]
+
+class RollupState(models.Model):
+    """Single row, locked while the rollups are compacted"""
+    compacted_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,72 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Publishing happens off the request thread so a slow or unavailable
+# broker never adds to checkout latency
+_relay_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox-relay')
+
+
+def enqueue_task(task, *args):
+    """
+    Record a Celery task to run once the current transaction commits.
+
+    The event row is written in the caller's transaction, so a rolled back
+    change emits nothing and a committed one is never lost: the relay
+    publishes it right after commit, and ``relay_outbox_events`` sweeps up
+    anything the relay couldn't deliver. Delivery is at least once, so
+    tasks must tolerate duplicates.
+    """
+    OutboxEvent.objects.create(task=task, args=list(args))
+    transaction.on_commit(schedule_relay)
+
+
+def schedule_relay():
+    if settings.OUTBOX_RELAY_IN_BACKGROUND:
+        _relay_executor.submit(_relay_in_thread)
+    else:
+        relay_outbox()
+
+
+def _relay_in_thread():
+    try:
+        relay_outbox()
+    except Exception:
+        logger.exception('Outbox relay failed')
+    finally:
+        close_old_connections()
+
+
+def relay_outbox(batch_size=None):
+    """
+    Publish one batch of pending events, oldest first, and return how many
+    were published. Stops at the first broker error, leaving the rest for
+    the next run.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        published = []
+        for event in events:
+            try:
+                current_app.send_task(event.task, args=event.args, retry=False)
+            except Exception:
+                logger.warning('Could not publish outbox event %s', event.id, exc_info=True)
+                OutboxEvent.objects.filter(id=event.id).update(attempts=event.attempts + 1)
+                break
+            published.append(event.id)
+
+        OutboxEvent.objects.filter(id__in=published).update(published_at=timezone.now())
+    return len(published)
@@ -0,0 +1,116 @@
+import re
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Product, ProductSearchTerm
+
+# Every word is indexed under each of its prefixes, so autocomplete
+# lookups are plain equality matches on the term index
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 1
+WHOLE_WORD_MULTIPLIER = 2
+MIN_PREFIX_LENGTH = 2
+MAX_TERM_LENGTH = ProductSearchTerm._meta.get_field('term').max_length
+MAX_QUERY_TERMS = 6
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercased, de-duplicated words of ``text`` in order of appearance"""
+    words = (word[:MAX_TERM_LENGTH] for word in _WORD_RE.findall(text.lower()))
+    return list(dict.fromkeys(words))
+
+
+def term_weights(name, category_name):
+    """Map each indexed term of a product to its weight"""
+    weights = {}
+    for text, weight in ((category_name, CATEGORY_WEIGHT), (name, NAME_WEIGHT)):
+        for word in tokenize(text):
+            for length in range(MIN_PREFIX_LENGTH, len(word)):
+                prefix = word[:length]
+                weights[prefix] = max(weights.get(prefix, 0), weight)
+            weights[word] = max(weights.get(word, 0), weight * WHOLE_WORD_MULTIPLIER)
+    return weights
+
+
+def build_terms(product):
+    weights = term_weights(product.name, product.category.name)
+    return [
+        ProductSearchTerm(product=product, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_products(products):
+    """Replace the search terms of ``products``, which need ``category`` loaded"""
+    products = list(products)
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product__in=products).delete()
+        ProductSearchTerm.objects.bulk_create(
+            term for product in products for term in build_terms(product)
+        )
+
+
+def rebuild_index(batch_size=2000):
+    ProductSearchTerm.objects.all().delete()
+    products = Product.objects.select_related('category').only('id', 'name', 'category__name')
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.extend(build_terms(product))
+        if len(batch) >= batch_size:
+            ProductSearchTerm.objects.bulk_create(batch)
+            batch = []
+    ProductSearchTerm.objects.bulk_create(batch)
+
+
+def query_tokens(query):
+    """The words of ``query`` that can be looked up in the index"""
+    return [token for token in tokenize(query) if len(token) >= MIN_PREFIX_LENGTH][:MAX_QUERY_TERMS]
+
+
+def match(query, products=None):
+    """
+    Ids of products where every word of ``query`` is a word, or the start
+    of a word, in the product or category name, as
+    ``{'product_id', 'score'}`` rows ordered best first. Name words
+    outrank category words, and whole words outrank prefixes.
+
+    ``products`` optionally restricts the search to a product queryset.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return ProductSearchTerm.objects.none().values('product_id')
+
+    matches = ProductSearchTerm.objects.filter(term__in=tokens)
+    if products is not None:
+        matches = matches.filter(product__in=products.values('id'))
+    # A product has at most one row per term, so matching every query
+    # word means matching as many rows as there are words
+    return (
+        matches.values('product_id')
+        .annotate(score=Sum('weight'), matched=Count('id'))
+        .filter(matched=len(tokens))
+        .values('product_id', 'score')
+        .order_by('-score', '-product_id')
+    )
+
+
+def filter_products(queryset, query):
+    """
+    ``queryset`` narrowed to the products ``match`` finds. A query too short
+    to be indexed, such as ``a``, matches the names starting with it instead.
+    """
+    if not query_tokens(query):
+        return queryset.filter(name__istartswith=query.strip())
+    return queryset.filter(id__in=match(query).values('product_id'))
+
+
+def ranked_products(queryset, query, limit):
+    """The ``limit`` best matches for ``query`` within ``queryset``, best first"""
+    # Restricting the match to an unfiltered queryset would only add a join
+    products = queryset if queryset.query.has_filters() else None
+    ids = [row['product_id'] for row in match(query, products)[:limit]]
+    products = queryset.in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
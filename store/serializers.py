@@ -1,20 +1,48 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import Category, Product, Cart, Order, OrderItem
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
+
+from config.serializers import ModelSerializer, Serializer
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'created_at', 'image_link']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'category', 'category_name', 'price', 'image_link', 'created_at', 'is_trending']
+        fields = ['id', 'sku', 'name', 'category', 'category_name', 'price', 'image_link', 'created_at', 'is_trending']
+
+class TrendingProductSerializer(ProductSerializer):
+    trending_score = serializers.FloatField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['trending_score']
 
-class CartSerializer(serializers.ModelSerializer):
+class ProductImportSerializer(Serializer):
+    """
+    One row of a catalog import. Every field is optional, as a row only
+    carries what changes; ``store.catalog_import`` runs the fields itself
+    rather than building a serializer per row.
+    """
+    id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(max_length=64, required=False)
+    name = serializers.CharField(max_length=200, required=False)
+    category = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    image_link = serializers.URLField(max_length=200, required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    is_trending = serializers.BooleanField(required=False)
+
+class CartSerializer(ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     image_link = serializers.CharField(source='product.image_link', read_only=True)
@@ -24,12 +52,61 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'product', 'product_name', 'quantity', 'total_price', 'created_at', 'image_link']
         read_only_fields = ['user']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+    def validate_product(self, product):
+        # A cart holds one row per product, so moving a row onto a product
+        # already in the cart would break the unique (user, product) constraint
+        instance = self.instance
+        if instance is not None and product.id != instance.product_id and Cart.objects.filter(
+            user_id=instance.user_id, product=product
+        ).exists():
+            raise serializers.ValidationError('This product is already in the cart.')
+        return product
+
+class CartCategorySummarySerializer(Serializer):
+    category = serializers.IntegerField()
+    category_name = serializers.CharField()
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+class CartSummarySerializer(Serializer):
+    line_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    categories = CartCategorySummarySerializer(many=True)
+
+class CartItemInputSerializer(Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class CartAddSerializer(CartItemInputSerializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+
+class CartBulkAddSerializer(Serializer):
+    # Products are checked for all items at once in validate_items
+    items = CartItemInputSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_items(self, items):
+        product_ids = {item['product'] for item in items}
+        found = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f"Invalid product ids: {', '.join(map(str, missing))}"
+            )
+        return items
+
+class OrderItemSerializer(ModelSerializer):
+    # Plain id on input; products are resolved for all items at once in
+    # OrderSerializer.validate_items rather than one query per item.
+    product = serializers.IntegerField(source='product_id')
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ModelSerializer):
     items = OrderItemSerializer(many=True)
 
     class Meta:
@@ -37,35 +114,94 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'items', 'total_amount', 'status', 'created_at']
         read_only_fields = ['user', 'created_at', 'total_amount']
 
+    def validate_items(self, items):
+        product_ids = {item['product_id'] for item in items}
+        products = Product.objects.in_bulk(product_ids)
+
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f"Invalid product ids: {', '.join(map(str, missing))}"
+            )
+
+        for item in items:
+            item['product'] = products[item.pop('product_id')]
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        total_amount = 0
+
+        # Build the items and the total up front so the order is inserted
+        # once with its final amount and the items in a single statement
+        items = [
+            OrderItem(
+                product=item_data['product'],
+                quantity=item_data['quantity'],
+                price=item_data['product'].price
+            )
+            for item_data in items_data
+        ]
+        total_amount = sum((item.price * item.quantity for item in items), 0)
 
         with transaction.atomic():
-            # First create the order
             order = Order.objects.create(
-                user=validated_data['user'],
-                total_amount=0,
+                user_id=validated_data['user_id'],
+                total_amount=total_amount,
                 status='pending'
             )
 
-            # Create order items
-            for item_data in items_data:
-                product = item_data['product']
-                quantity = item_data['quantity']
-                price = product.price
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=price
-                )
-                
-                total_amount += price * quantity
-
-            # Update order total
-            order.total_amount = total_amount
-            order.save()
-
-        return order
\ No newline at end of file
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+
+        return order
+
+class OrderExportSerializer(Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    output = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end")
+        return attrs
+
+class AnalyticsQuerySerializer(Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    interval = serializers.ChoiceField(choices=['day', 'month'], default='day')
+    category = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end")
+        return attrs
+
+class SalesTotalsSerializer(Serializer):
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class SalesPeriodSerializer(SalesTotalsSerializer):
+    period = serializers.DateField()
+
+class CategorySalesSerializer(SalesTotalsSerializer):
+    category = serializers.IntegerField(source='category_id')
+    category_name = serializers.CharField(allow_null=True)
+
+class ProductSalesSerializer(Serializer):
+    product = serializers.IntegerField(source='product_id')
+    product_name = serializers.CharField(allow_null=True)
+    category = serializers.IntegerField(source='category_id', allow_null=True)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class StockSerializer(Serializer):
+    date = serializers.DateField()
+    products = serializers.IntegerField()
+    units = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=16, decimal_places=2)
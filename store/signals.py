@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductTrendScore
+from .search import index_products
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    # After commit, or a concurrent reader could cache the rows from before
+    # the change under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if instance.has_changed('name', 'category_id', update_fields=update_fields):
+        index_products([instance])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, update_fields=None, **kwargs):
+    if not created and instance.has_changed('name', update_fields=update_fields):
+        index_products(instance.products.select_related('category').only('id', 'name', 'category__name'))
+
+
+@receiver(post_save, sender=Product)
+def move_trend_score(sender, instance, created, update_fields=None, **kwargs):
+    if created or not instance.has_changed('category_id', update_fields=update_fields):
+        return
+    ProductTrendScore.objects.filter(product_id=instance.id).exclude(
+        category_id=instance.category_id
+    ).update(category_id=instance.category_id)
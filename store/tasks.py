@@ -1,85 +1,237 @@
+from datetime import date, timedelta
+from functools import lru_cache
+from smtplib import (
+    SMTPConnectError,
+    SMTPDataError,
+    SMTPRecipientsRefused,
+    SMTPSenderRefused,
+    SMTPServerDisconnected,
+)
 from celery import shared_task
-from django.core.mail import send_mail, send_mass_mail
+from django.core.cache import caches
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.loader import get_template
+from django.utils import timezone
 from account.models import User
-from .models import Order, Product
+from .models import LowStockAlert, Order, OrderItem, OutboxEvent, Product
+from .outbox import relay_outbox
+from . import analytics, trending
+from .export import write_export
+
+def low_stock_dedupe_key(product_id):
+    return f'low_stock_alert:{product_id}'
+
+LOW_STOCK_DIGEST_SCHEDULED_KEY = 'low_stock_alert:digest_scheduled'
 
 @shared_task
 def send_low_stock_alert(product_id):
-    """Send alert when product stock is low"""
+    """Queue a product for the next low stock digest to admins"""
+    # Repeat alerts for the same SKU are dropped until the dedupe key expires
+    if not caches['tasks'].add(low_stock_dedupe_key(product_id), 1, timeout=settings.LOW_STOCK_ALERT_DEDUPE_TIMEOUT):
+        return f"Low stock alert for product {product_id} already sent"
+
     try:
-        product = Product.objects.get(id=product_id)
-        admin_users = User.objects.filter(is_staff=True)
-        
-        subject = f'Low Stock Alert - {product.name}'
-        message = f'The stock for {product.name} is running low. Current quantity: {product.quantity}'
-        
-        for admin in admin_users:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[admin.email],
-                fail_silently=False,
-            )
-        
-        return f"Low stock alert sent for {product.name}"
+        product = Product.objects.only('id', 'name', 'quantity').get(id=product_id)
     except Product.DoesNotExist:
+        caches['tasks'].delete(low_stock_dedupe_key(product_id))
         return "Product not found"
 
-@shared_task
-def send_bulk_email(subject, message):
-    """Send email to all users"""
-    try:
-        # Get all active users' email addresses
-        user_emails = User.objects.filter(is_active=True).values_list('email', flat=True)
-        
-        # Create mass email data
-        messages = [(
-            subject,
-            message,
-            settings.EMAIL_HOST_USER,
-            [email]
-        ) for email in user_emails]
-        
-        # Send mass mail
-        send_mass_mail(messages, fail_silently=False)
-        
-        return f"Bulk email sent to {len(user_emails)} users"
-    except Exception as e:
-        return f"Error sending bulk email: {str(e)}"
+    LowStockAlert.objects.create(product=product, quantity=product.quantity)
+
+    # The first alert of a window schedules the digest covering all of them
+    if caches['tasks'].add(LOW_STOCK_DIGEST_SCHEDULED_KEY, 1, timeout=settings.LOW_STOCK_ALERT_WINDOW):
+        send_low_stock_digest.apply_async(countdown=settings.LOW_STOCK_ALERT_WINDOW)
+
+    return f"Low stock alert queued for {product.name}"
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=5)
+def send_low_stock_digest():
+    """Email every admin one summary of the pending low stock alerts"""
+    caches['tasks'].delete(LOW_STOCK_DIGEST_SCHEDULED_KEY)
+
+    with transaction.atomic():
+        alerts = list(
+            LowStockAlert.objects.select_for_update()
+            .filter(sent_at__isnull=True)
+            .select_related('product')
+            .order_by('id')
+        )
+        if not alerts:
+            return "No pending low stock alerts"
+
+        subject = f'Low Stock Alert - {len(alerts)} product(s)'
+        lines = [
+            f"- {alert.product.name}: {alert.quantity} left" for alert in alerts
+        ]
+        message = 'The stock for these products is running low:\n\n' + '\n'.join(lines)
+
+        admin_emails = User.objects.filter(is_staff=True, is_active=True).values_list('email', flat=True)
+        messages = [
+            EmailMessage(subject, message, settings.EMAIL_HOST_USER, [email])
+            for email in admin_emails
+        ]
+        # One SMTP connection for all admins
+        get_connection(fail_silently=False).send_messages(messages)
+
+        LowStockAlert.objects.filter(id__in=[alert.id for alert in alerts]).update(sent_at=timezone.now())
+
+    return f"Low stock digest for {len(alerts)} product(s) sent to {len(messages)} admins"
+
+def bulk_email_checkpoint_key(campaign_id, first_id):
+    return f'bulk_email:{campaign_id}:{first_id}'
+
+@shared_task(bind=True)
+def send_bulk_email(self, subject, message):
+    """Send email to all users, fanned out into chunks of recipients"""
+    campaign_id = self.request.id
+    chunk_size = settings.BULK_EMAIL_CHUNK_SIZE
+
+    # Stream ids instead of loading every user, and hand each chunk over
+    # as an id range so the queued messages stay small
+    user_ids = (
+        User.objects.filter(is_active=True)
+        .order_by('id')
+        .values_list('id', flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+    recipients = chunks = 0
+    chunk = []
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) == chunk_size:
+            send_bulk_email_chunk.delay(campaign_id, subject, message, chunk[0], chunk[-1])
+            recipients += len(chunk)
+            chunks += 1
+            chunk = []
+    if chunk:
+        send_bulk_email_chunk.delay(campaign_id, subject, message, chunk[0], chunk[-1])
+        recipients += len(chunk)
+        chunks += 1
+
+    return f"Bulk email queued for {recipients} users in {chunks} chunks"
+
+@shared_task(
+    bind=True,
+    rate_limit=settings.BULK_EMAIL_RATE_LIMIT,
+    autoretry_for=(SMTPServerDisconnected, SMTPConnectError, OSError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def send_bulk_email_chunk(self, campaign_id, subject, message, first_id, last_id):
+    """
+    Send to the active users with ids in ``[first_id, last_id]`` over one
+    SMTP connection. The last id sent is checkpointed, so a retry after a
+    dropped connection resumes where it stopped instead of resending.
+    """
+    checkpoint_key = bulk_email_checkpoint_key(campaign_id, first_id)
+    sent_up_to = caches['tasks'].get(checkpoint_key, first_id - 1)
+    if sent_up_to >= last_id:
+        return f"Chunk {first_id}-{last_id} already sent"
+
+    recipients = (
+        User.objects.filter(is_active=True, id__gt=sent_up_to, id__lte=last_id)
+        .order_by('id')
+        .values_list('id', 'email')
+    )
+    sent, failed = 0, []
+    with get_connection(fail_silently=False) as connection:
+        for user_id, email in recipients.iterator(chunk_size=settings.BULK_EMAIL_CHUNK_SIZE):
+            email_message = EmailMessage(
+                subject, message, settings.EMAIL_HOST_USER, [email], connection=connection
+            )
+            try:
+                email_message.send()
+                sent += 1
+            except (SMTPRecipientsRefused, SMTPDataError, SMTPSenderRefused):
+                # Rejected by the server for this recipient only
+                failed.append(email)
+            caches['tasks'].set(checkpoint_key, user_id, timeout=settings.BULK_EMAIL_CHECKPOINT_TIMEOUT)
+
+    caches['tasks'].set(checkpoint_key, last_id, timeout=settings.BULK_EMAIL_CHECKPOINT_TIMEOUT)
+    if failed:
+        return f"Chunk {first_id}-{last_id}: sent {sent}, failed {len(failed)}: {', '.join(failed)}"
+    return f"Chunk {first_id}-{last_id}: sent {sent}"
+
+@lru_cache(maxsize=None)
+def order_confirmation_template():
+    # Parsed once per worker process
+    return get_template('store/emails/order_confirmation.txt')
+
+def orders_for_confirmation():
+    """Orders with everything the confirmation renders, in two queries"""
+    return Order.objects.select_related('user').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+            'id', 'order_id', 'quantity', 'price', 'product__name'
+        ))
+    )
+
+def build_order_confirmation(order, connection=None):
+    return EmailMessage(
+        subject=f'Order Confirmation - Order #{order.id}',
+        body=order_confirmation_template().render({'order': order}),
+        from_email=settings.EMAIL_HOST_USER,
+        to=[order.user.email],
+        connection=connection,
+    )
 
 @shared_task
 def send_order_confirmation(order_id):
     """Send order confirmation email"""
     try:
-        order = Order.objects.get(id=order_id)
-        subject = f'Order Confirmation - Order #{order.id}'
-        message = f"""
-        Dear {order.user.email},
-
-        Thank you for your order! Here are your order details:
-
-        Order ID: {order.id}
-        Total Amount: ${order.total_amount}
-        Status: {order.status}
-
-        Order Items:
-        """
-        
-        for item in order.items.all():
-            message += f"\n- {item.product.name} x {item.quantity} @ ${item.price} each"
-        
-        message += "\n\nThank you for shopping with us!"
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.EMAIL_HOST_USER,
-            recipient_list=[order.user.email],
-            fail_silently=False,
-        )
-        
-        return f"Order confirmation sent for Order #{order.id}"
+        order = orders_for_confirmation().get(id=order_id)
     except Order.DoesNotExist:
-        return "Order not found"
\ No newline at end of file
+        return "Order not found"
+
+    build_order_confirmation(order).send(fail_silently=False)
+    return f"Order confirmation sent for Order #{order.id}"
+
+@shared_task
+def send_order_confirmations(order_ids):
+    """Send confirmations for many orders over one SMTP connection"""
+    chunk_size = settings.ORDER_CONFIRMATION_BATCH_SIZE
+    sent = 0
+    with get_connection(fail_silently=False) as connection:
+        for start in range(0, len(order_ids), chunk_size):
+            orders = orders_for_confirmation().filter(id__in=order_ids[start:start + chunk_size])
+            sent += connection.send_messages([
+                build_order_confirmation(order, connection) for order in orders
+            ]) or 0
+
+    return f"Order confirmations sent for {sent} of {len(order_ids)} orders"
+
+@shared_task
+def relay_outbox_events():
+    """Publish outbox events the post-commit relay missed, and prune old ones"""
+    published = 0
+    while True:
+        count = relay_outbox()
+        published += count
+        if count < settings.OUTBOX_BATCH_SIZE:
+            break
+
+    cutoff = timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION)
+    OutboxEvent.objects.filter(published_at__lt=cutoff).delete()
+    return f"Published {published} outbox event(s)"
+
+@shared_task
+def update_trending_scores():
+    """Fold new sales into the trending products ranking"""
+    updated = trending.update_trending_scores()
+    return f"Updated trend scores of {updated} product(s)"
+
+@shared_task
+def compact_sales_rollups():
+    """Fold new sales into the daily analytics rollups"""
+    compacted = analytics.compact_sales_rollups()
+    return f"Compacted {compacted} sales delta(s)"
+
+@shared_task
+def export_orders(name, output, start=None, end=None, status=None):
+    """Write an order export to a file in ``EXPORT_DIR``"""
+    start = start and date.fromisoformat(start)
+    end = end and date.fromisoformat(end)
+    path = write_export(name, output, start=start, end=end, status=status)
+    return f"Orders exported to {path}"
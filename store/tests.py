@@ -1,3 +1,1681 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import User
+from .analytics import compact_sales_rollups
+from .cache import aget_catalog_version, bump_catalog_version, get_catalog_version
+from .cart import add_to_cart
+from .management.commands.benchmark_api import compare
+from .management.commands.explain_querysets import find_full_scans
+from .models import (
+    Category, DailyCategorySales, DailyProductSales, DailySales, DailyStock, LowStockAlert, Product,
+    ProductSearchTerm, ProductTrendScore, Cart, Order, OrderItem, OutboxEvent, SalesDelta, TrendingState,
+)
+from .pagination import CreatedAtCursorPagination
+from .projections import ValuesProjection
+from .serializers import CartSerializer, OrderSerializer, ProductSerializer
+from .tasks import (
+    bulk_email_checkpoint_key,
+    relay_outbox_events,
+    send_bulk_email,
+    send_bulk_email_chunk,
+    send_low_stock_alert,
+    send_low_stock_digest,
+    send_order_confirmation,
+    export_orders,
+    send_order_confirmations,
+    update_trending_scores,
+)
+from .trending import update_trending_scores as fold_sales
+from .views import CartViewSet, OrderViewSet, ProductViewSet
+
+
+# The task state cache is Redis everywhere else
+TASK_CACHES = {
+    **settings.CACHES,
+    'tasks': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'store-tests-tasks'},
+}
+
+
+class StoreTestMixin:
+    """Shared fixtures for the store API tests"""
+
+    def create_user(self, email='customer@example.com', **extra_fields):
+        return User.objects.create_user(email=email, password='pass12345', **extra_fields)
+
+    def create_category(self, name='Groceries'):
+        return Category.objects.create(name=name)
+
+    def create_products(self, count, category=None, **extra_fields):
+        categories = [category] if category else [
+            self.create_category(f'Category {i}') for i in range(3)
+        ]
+        extra_fields.setdefault('quantity', 100)
+        extra_fields.setdefault('price', Decimal('9.99'))
+        return [
+            Product.objects.create(
+                name=f'Product {i}',
+                category=categories[i % len(categories)],
+                image_link='https://example.com/product.jpg',
+                **extra_fields
+            )
+            for i in range(count)
+        ]
+
+    def count_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, len(context.captured_queries)
+
+    def assertQueryCountIndependentOfSize(self, url, populate, sizes=(2, 20)):
+        """
+        Calls ``populate(n)`` for each size and checks that ``url`` costs
+        the same number of queries no matter how many rows it returns.
+        """
+        counts = []
+        for size in sizes:
+            # Catalog writes invalidate cached responses once committed
+            with self.captureOnCommitCallbacks(execute=True):
+                populate(size)
+            response, num_queries = self.count_queries('get', url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(num_queries)
+        self.assertEqual(len(set(counts)), 1, f'Query count grew with rows: {counts}')
+        return counts[0]
+
+
+class EagerLoadingTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_product_list_query_count(self):
+        num_queries = self.assertQueryCountIndependentOfSize(
+            '/api/store/products/', self.create_products
+        )
+        self.assertEqual(num_queries, 1)
+
+    def test_product_updates_load_every_field(self):
+        product, = self.create_products(1)
+        self.client.force_authenticate(self.create_user('admin@example.com', is_staff=True))
+        response = self.client.patch(f'/api/store/products/{product.id}/', {'price': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(Product.objects.get(id=product.id).updated_at, product.updated_at)
+
+    def test_cart_list_query_count(self):
+        def populate(size):
+            Cart.objects.bulk_create(
+                Cart(user=self.user, product=product, quantity=2)
+                for product in self.create_products(size)
+            )
+
+        num_queries = self.assertQueryCountIndependentOfSize('/api/store/carts/', populate)
+        self.assertEqual(num_queries, 1)
+
+    def test_order_list_query_count(self):
+        def populate(size):
+            products = self.create_products(size)
+            order = Order.objects.create(user=self.user, total_amount=0)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, quantity=1, price=product.price)
+                for product in products
+            )
+
+        num_queries = self.assertQueryCountIndependentOfSize('/api/store/orders/', populate)
+        self.assertEqual(num_queries, 2)
+
+    def test_cart_item_for_product_is_eager_loaded(self):
+        product = self.create_products(1)[0]
+        Cart.objects.create(user=self.user, product=product, quantity=3)
+        response, num_queries = self.count_queries(
+            'get', '/api/store/carts/', data={'product': product.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product_name'], product.name)
+        self.assertEqual(Decimal(response.data['total_price']), product.price * 3)
+        self.assertEqual(num_queries, 1)
+
+
+class CursorPaginationTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def collect_pages(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_products_are_paged_newest_first_without_gaps(self):
+        products = self.create_products(7)
+        # Give some rows identical timestamps to exercise the id tie-breaker
+        Product.objects.filter(id__in=[p.id for p in products[:4]]).update(
+            created_at=products[0].created_at
+        )
+
+        ids, pages = self.collect_pages('/api/store/products/?page_size=3')
+
+        expected = list(
+            Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    @mock.patch.object(CreatedAtCursorPagination, 'max_page_size', 2)
+    def test_page_size_is_capped(self):
+        self.create_products(3)
+        response = self.client.get('/api/store/products/?page_size=100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_carts_and_orders_are_paginated(self):
+        for product in self.create_products(3):
+            Cart.objects.create(user=self.user, product=product)
+            Order.objects.create(user=self.user, total_amount=product.price)
+
+        for url in ('/api/store/carts/?page_size=2', '/api/store/orders/?page_size=2'):
+            ids, pages = self.collect_pages(url)
+            self.assertEqual(len(set(ids)), 3)
+            self.assertEqual(pages, 2)
+
+    def test_page_query_count_is_independent_of_page_size(self):
+        self.create_products(30)
+        _, small = self.count_queries('get', '/api/store/products/?page_size=5')
+        _, large = self.count_queries('get', '/api/store/products/?page_size=25')
+        self.assertEqual(small, large)
+
+
+class OrderCreateTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def place_order(self, products, quantity=2):
+        items = [{'product': product.id, 'quantity': quantity} for product in products]
+        return self.count_queries('post', '/api/store/orders/', data={'items': items}, format='json')
+
+    def test_order_totals_and_items(self):
+        products = self.create_products(3)
+        response, _ = self.place_order(products)
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(order.total_amount, Decimal('9.99') * 6)
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(
+            sorted(item['product'] for item in response.data['items']),
+            sorted(product.id for product in products)
+        )
+
+    def test_query_count_is_independent_of_item_count(self):
+        _, small = self.place_order(self.create_products(2))
+        _, large = self.place_order(self.create_products(30))
+        self.assertEqual(small, large)
+
+    def test_unknown_products_are_rejected(self):
+        product = self.create_products(1)[0]
+        response = self.client.post(
+            '/api/store/orders/',
+            data={'items': [{'product': product.id, 'quantity': 1}, {'product': 999999, 'quantity': 1}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', str(response.data['items']))
+        self.assertFalse(Order.objects.exists())
+
+
+@mock.patch('store.outbox.schedule_relay', mock.Mock())
+class StockReservationTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+
+    def order(self, *lines):
+        items = [{'product': product.id, 'quantity': quantity} for product, quantity in lines]
+        return self.client.post('/api/store/orders/', data={'items': items}, format='json')
+
+    def test_checkout_decrements_stock(self):
+        first, second = self.create_products(2, quantity=20)
+        response = self.order((first, 3), (second, 5), (first, 2))
+
+        self.assertEqual(response.status_code, 201)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.quantity, second.quantity), (15, 15))
+
+    def test_oversell_is_rejected_and_nothing_is_reserved(self):
+        plenty, scarce = self.create_products(2, quantity=5)
+        response = self.order((plenty, 1), (scarce, 6))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(scarce.id), str(response.data['items']))
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('quantity', flat=True)), [5, 5]
+        )
+        self.assertFalse(Order.objects.exists())
+
+    def test_low_stock_alert_is_queued_once_when_crossing_threshold(self):
+        product = self.create_products(1, quantity=12)[0]
+        alerts = OutboxEvent.objects.filter(task=send_low_stock_alert.name)
+
+        self.order((product, 1))
+        self.assertFalse(alerts.exists())
+
+        self.order((product, 2))
+        self.assertEqual(list(alerts.values_list('args', flat=True)), [[product.id]])
+
+        self.order((product, 1))
+        self.assertEqual(alerts.count(), 1)
+
+    @mock.patch('store.outbox.current_app')
+    def test_low_stock_alert_does_not_wait_for_the_broker(self, app):
+        app.send_task.side_effect = OSError('Broker unavailable')
+        product = self.create_products(1, quantity=11)[0]
+
+        with self.settings(OUTBOX_RELAY_IN_BACKGROUND=False), self.captureOnCommitCallbacks(execute=True):
+            response = self.order((product, 2))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(OutboxEvent.objects.filter(
+            task=send_low_stock_alert.name, published_at__isnull=True
+        ).exists())
+
+
+class StockReservationStressTests(StoreTestMixin, TransactionTestCase):
+    """
+    Needs a database that lets concurrent transactions wait on each other:
+    MySQL, or a file-backed SQLite test database (``TEST['NAME']``) with
+    ``OPTIONS['transaction_mode'] = 'IMMEDIATE'``
+    """
+    threads = 16
+    orders_per_thread = 10
+    stock = 100
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and (
+            connection.is_in_memory_db() or connection.transaction_mode != 'IMMEDIATE'
+        ):
+            self.skipTest('SQLite needs a file test database in IMMEDIATE transaction mode')
+
+    def test_concurrent_checkouts_of_hot_sku_never_oversell(self):
+        product = self.create_products(1, quantity=self.stock)[0]
+        users = [self.create_user(f'buyer{i}@example.com') for i in range(self.threads)]
+        statuses = []
+
+        def buy(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                for _ in range(self.orders_per_thread):
+                    response = client.post(
+                        '/api/store/orders/',
+                        data={'items': [{'product': product.id, 'quantity': 1}]},
+                        format='json'
+                    )
+                    statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        with mock.patch('store.outbox.schedule_relay'):
+            with ThreadPoolExecutor(max_workers=self.threads) as pool:
+                list(pool.map(buy, users))
+
+        product.refresh_from_db()
+        sold = statuses.count(201)
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(statuses.count(400), len(statuses) - sold)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(
+            OrderItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'],
+            self.stock
+        )
+
+
+class CatalogCacheTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = self.create_category()
+        self.products = self.create_products(3, category=self.category)
+
+    def test_repeat_reads_skip_the_database(self):
+        for url in (
+            '/api/store/products/',
+            f'/api/store/products/{self.products[0].id}/',
+            '/api/store/categories/',
+            f'/api/store/categories/{self.category.id}/',
+        ):
+            first, first_queries = self.count_queries('get', url)
+            second, second_queries = self.count_queries('get', url)
+            self.assertGreater(first_queries, 0)
+            self.assertEqual(second_queries, 0)
+            self.assertEqual(second.data, first.data)
+
+    def test_product_and_category_writes_invalidate(self):
+        self.client.get('/api/store/products/')
+
+        product = self.products[0]
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response, num_queries = self.count_queries('get', '/api/store/products/')
+        self.assertGreater(num_queries, 0)
+        self.assertIn('Renamed', [row['name'] for row in response.data['results']])
+
+        self.category.name = 'Fresh produce'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        response = self.client.get('/api/store/products/')
+        self.assertEqual(
+            {row['category_name'] for row in response.data['results']}, {'Fresh produce'}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        response = self.client.get('/api/store/products/')
+        self.assertNotIn(product.id, [row['id'] for row in response.data['results']])
+
+    def test_version_is_bumped_after_commit(self):
+        before = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+            # A reader before the commit must not cache the old rows as new
+            self.assertEqual(get_catalog_version(), before)
+        self.assertNotEqual(get_catalog_version(), before)
+
+    def test_filtered_and_missing_requests_are_not_cached(self):
+        url = f'/api/store/products/?category={self.category.id}'
+        self.client.get(url)
+        _, num_queries = self.count_queries('get', url)
+        self.assertGreater(num_queries, 0)
+
+        self.assertEqual(self.client.get('/api/store/products/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/store/products/999999/').status_code, 404)
+
+    def test_concurrent_rebuild_serves_previous_response(self):
+        before = self.client.get('/api/store/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='New arrivals')
+
+        # Another worker is rebuilding the entry for the new version
+        key = f'store:catalog:{get_catalog_version()}:http://testserver/api/store/categories/'
+        cache.add(f'{key}:lock', 1)
+
+        response, num_queries = self.count_queries('get', '/api/store/categories/')
+        self.assertEqual(num_queries, 0)
+        self.assertEqual(response.data, before.data)
+        # Validated as the previous body, not as the new version's
+        self.assertEqual(response['ETag'], before['ETag'])
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    @override_settings(CATALOG_CACHE_LOCK_POLLS=2, CATALOG_CACHE_LOCK_POLL_INTERVAL=0)
+    def test_waiter_falls_back_to_database_without_stale_copy(self):
+        key = f'store:catalog:{get_catalog_version()}:http://testserver/api/store/categories/'
+        cache.add(f'{key}:lock', 1)
+
+        response = self.client.get('/api/store/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+
+class ConditionalRequestTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = self.create_products(3)
+
+    def test_unchanged_catalog_is_not_modified(self):
+        for url in ('/api/store/products/', f'/api/store/products/{self.products[0].id}/',
+                    '/api/store/categories/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Last-Modified', response)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=0, s-maxage=5')
+
+            with self.assertNumQueries(0):
+                cached = self.client.get(url, headers={'if-none-match': response['ETag']})
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b'')
+            self.assertEqual(cached['ETag'], response['ETag'])
+
+            cached = self.client.get(url, headers={'if-modified-since': response['Last-Modified']})
+            self.assertEqual(cached.status_code, 304)
+
+    def test_catalog_changes_invalidate_validators(self):
+        url = '/api/store/products/'
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].delete()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators_vary_with_url(self):
+        first = self.client.get('/api/store/products/?page_size=1')
+        second = self.client.get('/api/store/products/?page_size=2')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_last_modified_falls_back_to_the_database(self):
+        cache.clear()
+        latest = Product.objects.latest('updated_at').updated_at
+        response = self.client.get('/api/store/categories/')
+        self.assertEqual(response['Last-Modified'], http_date(int(latest.timestamp())))
+
+    def test_authenticated_responses_are_private(self):
+        self.client.force_authenticate(self.create_user())
+        response = self.client.get('/api/store/products/', headers={'authorization': 'Bearer token'})
+        self.assertEqual(response['Cache-Control'], 'private, max-age=0')
+
+    def test_errors_carry_no_validators(self):
+        response = self.client.get('/api/store/products/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class ProductSearchTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.fruit = self.create_category('Fresh Fruit')
+        self.audio = self.create_category('Audio')
+        self.apple = self.make_product('Green Apple', self.fruit)
+        self.juice = self.make_product('Apple Juice Pack', self.fruit)
+        self.speaker = self.make_product('Wireless Speaker', self.audio)
+        self.headphones = self.make_product('Wireless Headphones', self.audio)
+
+    def make_product(self, name, category):
+        return Product.objects.create(
+            name=name, category=category, price=Decimal('1.00'), image_link='https://example.com/p.jpg'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get('/api/store/products/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data]
+
+    def test_name_filter_matches_word_prefixes(self):
+        response = self.client.get('/api/store/products/', {'name': 'wire spea'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.speaker.id])
+
+        response = self.client.get('/api/store/products/', {'name': 'fruit'})
+        self.assertEqual(
+            {row['id'] for row in response.data['results']}, {self.apple.id, self.juice.id}
+        )
+
+    def test_name_filter_too_short_to_index_matches_name_starts(self):
+        response = self.client.get('/api/store/products/', {'name': 'w'})
+        self.assertEqual(
+            {row['id'] for row in response.data['results']}, {self.speaker.id, self.headphones.id}
+        )
+
+    def test_search_ranks_name_matches_above_category_matches(self):
+        fruit_named = self.make_product('Fruit Basket', self.audio)
+        self.assertEqual(self.search('fruit')[0], fruit_named.name)
+
+    def test_search_ranks_whole_words_above_prefixes(self):
+        self.make_product('Applesauce', self.fruit)
+        results = self.search('apple')
+        self.assertEqual(results[-1], 'Applesauce')
+        self.assertEqual(len(results), 3)
+
+    def test_search_limit_and_empty_query(self):
+        self.assertEqual(len(self.search('wireless', limit=1)), 1)
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.search('???'), [])
+
+    def test_index_follows_product_and_category_changes(self):
+        self.speaker.name = 'Bluetooth Speaker'
+        self.speaker.save()
+        self.assertEqual(self.search('bluetooth'), ['Bluetooth Speaker'])
+        self.assertEqual(self.search('wireless'), ['Wireless Headphones'])
+
+        self.audio.name = 'Sound'
+        self.audio.save()
+        self.assertEqual(len(self.search('sound')), 2)
+        self.assertEqual(self.search('audio'), [])
+
+    def test_other_changes_skip_reindexing(self):
+        speaker = Product.objects.get(id=self.speaker.id)
+        speaker.price = Decimal('2.00')
+        audio = Category.objects.get(id=self.audio.id)
+        audio.image_link = 'https://example.com/audio.jpg'
+        with mock.patch('store.signals.index_products') as index_products:
+            speaker.save()
+            audio.save()
+            speaker.name = 'Bluetooth Speaker'
+            speaker.save(update_fields=['price'])
+        index_products.assert_not_called()
+
+        speaker.save()
+        self.assertEqual(self.search('bluetooth'), ['Bluetooth Speaker'])
+
+        self.headphones.delete()
+        self.assertEqual(self.search('headphones'), [])
+
+    def test_rebuild_index(self):
+        ProductSearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('juice'), ['Apple Juice Pack'])
+
+
+class ExplainQuerysetsTests(TestCase):
+    def test_every_listing_is_explained_without_full_scans(self):
+        out = StringIO()
+        call_command('explain_querysets', '--fail-on-scan', stdout=out)
+        output = out.getvalue()
+        for basename in ('category', 'product', 'cart', 'order'):
+            self.assertIn(f'ok        {basename} as customer', output)
+        self.assertNotIn('email', output)
+
+    def test_find_full_scans(self):
+        mysql_plan = json.dumps({'query_block': {'nested_loop': [
+            {'table': {'table_name': 'store_product', 'access_type': 'ALL'}},
+            {'table': {'table_name': 'store_category', 'access_type': 'eq_ref'}},
+        ]}})
+        self.assertEqual(find_full_scans(mysql_plan, 'mysql'), ['store_product'])
+
+        sqlite_plan = (
+            '2 0 0 SCAN store_product\n'
+            '3 0 0 SCAN store_order USING INDEX order_created_id_idx\n'
+            '4 0 0 SEARCH store_cart USING INDEX cart_user_created_id_idx (user_id=?)'
+        )
+        self.assertEqual(find_full_scans(sqlite_plan, 'sqlite'), ['store_product'])
+        self.assertEqual(
+            find_full_scans('Seq Scan on store_order  (cost=0.00..1.01 rows=1)', 'postgresql'),
+            ['store_order']
+        )
+
+
+class BenchmarkApiTests(TestCase):
+    sizes = ['--categories=2', '--products=10', '--users=3', '--carts-per-user=2',
+             '--orders-per-user=1', '--items-per-order=2']
+
+    def test_runs_every_scenario_and_rolls_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            call_command(
+                'benchmark_api', *self.sizes, '--requests=2', '--warmup=0',
+                f'--output={path}', stdout=StringIO(),
+            )
+            with open(path) as f:
+                report = json.load(f)
+
+        results = report['results']
+        self.assertIn('products.list', results)
+        self.assertIn('account.login', results)
+        self.assertEqual(results['orders.list']['queries_per_request'], 2)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_compare(self):
+        baseline = {'sizes': {'products': 10}, 'results': {
+            'products.list': {'p95_ms': 10, 'queries_per_request': 1},
+            'carts.list': {'p95_ms': 10, 'queries_per_request': 1},
+        }}
+        report = {'sizes': {'products': 10}, 'results': {
+            'products.list': {'p95_ms': 12, 'queries_per_request': 1},
+            'carts.list': {'p95_ms': 14, 'queries_per_request': 2},
+            'orders.list': {'p95_ms': 99, 'queries_per_request': 9},
+        }}
+        self.assertEqual(compare(baseline, report, tolerance=0.25), [
+            'carts.list: p95 10 ms -> 14 ms',
+            'carts.list: queries per request 1 -> 2',
+        ])
+
+
+class CartUpsertTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        self.products = self.create_products(3)
+
+    def add(self, product, quantity=None):
+        data = {'product': product.id}
+        if quantity is not None:
+            data['quantity'] = quantity
+        return self.client.post('/api/store/carts/', data=data, format='json')
+
+    def test_adding_twice_increments_one_row(self):
+        product = self.products[0]
+        first = self.add(product, 2)
+        second = self.add(product, 3)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second.data['quantity'], 5)
+        self.assertEqual(Decimal(second.data['total_price']), product.price * 5)
+        self.assertEqual(Cart.objects.get().quantity, 5)
+
+    def test_default_quantity_and_validation(self):
+        self.assertEqual(self.add(self.products[0]).data['quantity'], 1)
+        self.assertEqual(self.add(self.products[1], 0).status_code, 400)
+
+        response = self.client.post('/api/store/carts/', data={'product': 999999}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('product', response.data)
+
+    def test_upsert_is_a_single_statement(self):
+        self.add(self.products[0])
+        with CaptureQueriesContext(connection) as context:
+            self.add(self.products[0], 4)
+        writes = [q['sql'] for q in context.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(writes), 1)
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in context.captured_queries))
+
+    def test_bulk_add(self):
+        self.add(self.products[0], 1)
+        items = [
+            {'product': self.products[0].id, 'quantity': 2},
+            {'product': self.products[1].id},
+            {'product': self.products[1].id, 'quantity': 4},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/store/carts/bulk/', data={'items': items}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {row['product']: row['quantity'] for row in response.data},
+            {self.products[0].id: 3, self.products[1].id: 5}
+        )
+        self.assertEqual(Cart.objects.count(), 2)
+        writes = [q['sql'] for q in context.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(writes), 1)
+
+    def test_update_onto_a_product_already_in_the_cart(self):
+        first = self.add(self.products[0]).data['id']
+        self.add(self.products[1])
+        response = self.client.patch(
+            f'/api/store/carts/{first}/', data={'product': self.products[1].id}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('product', response.data)
+
+        response = self.client.patch(
+            f'/api/store/carts/{first}/', data={'product': self.products[2].id}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_to_cart_counts_new_products(self):
+        self.add(self.products[0])
+        items = [(product.id, 2) for product in self.products]
+        self.assertEqual(add_to_cart(self.user.id, items), 2)
+        self.assertEqual(add_to_cart(self.user.id, items), 0)
+
+    def test_bulk_add_rejects_unknown_products(self):
+        items = [{'product': self.products[0].id}, {'product': 999999}]
+        response = self.client.post('/api/store/carts/bulk/', data={'items': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', str(response.data['items']))
+        self.assertFalse(Cart.objects.exists())
+
+        response = self.client.post('/api/store/carts/bulk/', data={'items': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CartSummaryTests(StoreTestMixin, TestCase):
+    url = '/api/store/carts/summary/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        fruit, dairy = self.create_category('Fruit'), self.create_category('Dairy')
+        self.apples, self.pears = self.create_products(2, category=fruit)
+        self.milk, = self.create_products(1, category=dairy, price=Decimal('0.10'))
+
+        for product, quantity in ((self.apples, 2), (self.pears, 1), (self.milk, 3)):
+            Cart.objects.create(user=self.user, product=product, quantity=quantity)
+        other = self.create_user('other@example.com')
+        Cart.objects.create(user=other, product=self.apples, quantity=50)
+
+    def test_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['line_count'], 3)
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(response.data['subtotal'], '30.27')
+        self.assertEqual(
+            [(row['category_name'], row['item_count'], row['subtotal'])
+             for row in response.data['categories']],
+            [('Dairy', 3, '0.30'), ('Fruit', 3, '29.97')],
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, response.data)
+
+    def test_empty_cart(self):
+        self.client.force_authenticate(self.create_user('empty@example.com'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {
+            'line_count': 0, 'item_count': 0, 'subtotal': '0.00', 'categories': [],
+        })
+
+    def test_cart_changes_refresh_summary(self):
+        self.client.get(self.url)
+
+        self.client.post('/api/store/carts/', data={'product': self.milk.id}, format='json')
+        self.assertEqual(self.client.get(self.url).data['item_count'], 7)
+
+        cart_item = Cart.objects.get(user=self.user, product=self.apples)
+        self.client.patch(f'/api/store/carts/{cart_item.id}/', data={'quantity': 1}, format='json')
+        self.assertEqual(self.client.get(self.url).data['item_count'], 6)
+
+        self.client.delete(f'/api/store/carts/{cart_item.id}/')
+        self.assertEqual(self.client.get(self.url).data['line_count'], 2)
+
+        self.client.delete('/api/store/carts/clear/')
+        self.assertEqual(self.client.get(self.url).data['item_count'], 0)
+
+    def test_price_change_refreshes_summary(self):
+        self.client.get(self.url)
+        self.milk.price = Decimal('1.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.save()
+        self.assertEqual(self.client.get(self.url).data['subtotal'], '32.97')
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@override_settings(TRENDING_HALF_LIFE=3600, TRENDING_SETTLE_DELAY=60)
+class TrendingTests(StoreTestMixin, TestCase):
+    url = '/api/store/products/trending/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.fruit, self.dairy = self.create_category('Fruit'), self.create_category('Dairy')
+        self.apples, self.pears = self.create_products(2, category=self.fruit)
+        self.milk, = self.create_products(1, category=self.dairy)
+        # On the hour, so a sale half an hour old is weighted at its own age
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def sell(self, product, quantity, age, status='pending'):
+        order = Order.objects.create(user=self.user, total_amount=0, status=status)
+        Order.objects.filter(id=order.id).update(created_at=self.now - timezone.timedelta(seconds=age))
+        return OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+
+    def scores(self):
+        return {
+            product_id: round(score, 3)
+            for product_id, score in ProductTrendScore.objects.values_list('product_id', 'score')
+        }
+
+    def test_sales_decay_with_age(self):
+        self.sell(self.apples, 4, age=5400)
+        self.sell(self.pears, 1, age=1800)
+        self.sell(self.milk, 10, age=1800, status='cancelled')
+
+        self.assertEqual(fold_sales(self.now), 2)
+        self.assertEqual(self.scores(), {self.apples.id: 1.414, self.pears.id: 0.707})
+
+    def test_incremental_update(self):
+        self.sell(self.apples, 4, age=1800)
+        fold_sales(self.now)
+        state = TrendingState.objects.get()
+
+        # Two hours on, the old score has decayed and only the new sale is read
+        self.now += timezone.timedelta(hours=2)
+        item = self.sell(self.apples, 1, age=1800)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(fold_sales(self.now), 1)
+        self.assertEqual(self.scores(), {self.apples.id: 1.414})
+        self.assertTrue(any(
+            f'"id" > {state.last_order_item_id}' in query['sql'] for query in context.captured_queries
+        ))
+        self.assertEqual(TrendingState.objects.get().last_order_item_id, item.id)
+
+    def test_recent_orders_wait_to_settle(self):
+        self.sell(self.apples, 1, age=10)
+        self.assertEqual(fold_sales(self.now), 0)
+        self.assertEqual(TrendingState.objects.get().last_order_item_id, 0)
+
+        self.now += timezone.timedelta(minutes=5)
+        self.assertEqual(fold_sales(self.now), 1)
+
+    @override_settings(TRENDING_MIN_SCORE=0.5)
+    def test_faded_products_are_removed(self):
+        self.sell(self.apples, 1, age=1800)
+        fold_sales(self.now)
+        self.now += timezone.timedelta(hours=2)
+        fold_sales(self.now)
+        self.assertEqual(ProductTrendScore.objects.count(), 0)
+
+    def test_sales_older_than_window_are_ignored(self):
+        self.sell(self.apples, 1, age=settings.TRENDING_WINDOW + 3600)
+        self.assertEqual(fold_sales(self.now), 0)
+
+    def test_task(self):
+        self.sell(self.apples, 1, age=1800)
+        self.assertEqual(update_trending_scores.apply().get(), 'Updated trend scores of 1 product(s)')
+
+    def test_endpoint(self):
+        self.sell(self.apples, 3, age=1800)
+        self.sell(self.pears, 2, age=1800)
+        self.sell(self.milk, 1, age=1800)
+        fold_sales(self.now)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual([product['id'] for product in response.data], [self.apples.id, self.pears.id])
+        self.assertEqual(response.data[0]['category_name'], 'Fruit')
+        self.assertEqual(response.data[0]['trending_score'], 2.1213)
+
+        response = self.client.get(self.url, {'category': self.dairy.id})
+        self.assertEqual([product['id'] for product in response.data], [self.milk.id])
+
+        self.assertEqual(self.client.get(self.url, {'limit': 'many'}).status_code, 400)
+
+    def test_category_change_moves_score(self):
+        self.sell(self.apples, 1, age=1800)
+        fold_sales(self.now)
+        self.apples.category = self.dairy
+        self.apples.save()
+
+        response = self.client.get(self.url, {'category': self.dairy.id})
+        self.assertEqual([product['id'] for product in response.data], [self.apples.id])
+
+
+class SalesAnalyticsTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = self.create_user()
+        self.admin = self.create_user('admin@example.com', is_staff=True)
+        self.fruit, self.dairy = self.create_category('Fruit'), self.create_category('Dairy')
+        self.apples, self.pears = self.create_products(2, category=self.fruit)
+        self.milk, = self.create_products(1, category=self.dairy, price=Decimal('1.50'))
+        self.today = timezone.localdate().isoformat()
+
+    def place_order(self, *items):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/store/orders/', data={'items': [
+            {'product': product.id, 'quantity': quantity} for product, quantity in items
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def report(self, name, **params):
+        self.client.force_authenticate(self.admin)
+        return self.client.get(f'/api/store/analytics/{name}/', params)
+
+    def test_orders_append_deltas(self):
+        self.place_order((self.apples, 2), (self.pears, 1), (self.milk, 4))
+        self.assertEqual(
+            sorted(SalesDelta.objects.values_list('product_id', 'orders', 'day_orders', 'units', 'revenue')),
+            [(self.apples.id, 1, 1, 2, Decimal('19.98')), (self.pears.id, 0, 0, 1, Decimal('9.99')),
+             (self.milk.id, 1, 0, 4, Decimal('6.00'))],
+        )
+
+    def test_compaction_merges_deltas(self):
+        self.place_order((self.apples, 2), (self.milk, 4))
+        self.assertEqual(compact_sales_rollups(), 2)
+        self.place_order((self.apples, 1), (self.pears, 1))
+        self.assertEqual(compact_sales_rollups(batch_size=1), 2)
+
+        self.assertFalse(SalesDelta.objects.exists())
+        self.assertEqual(
+            sorted(DailyProductSales.objects.values_list('product_id', 'units', 'revenue')),
+            [(self.apples.id, 3, Decimal('29.97')), (self.pears.id, 1, Decimal('9.99')),
+             (self.milk.id, 4, Decimal('6.00'))],
+        )
+        self.assertEqual(
+            sorted(DailyCategorySales.objects.values_list('category_id', 'orders', 'units', 'revenue')),
+            [(self.fruit.id, 2, 4, Decimal('39.96')), (self.dairy.id, 1, 4, Decimal('6.00'))],
+        )
+        self.assertEqual(
+            list(DailySales.objects.values_list('orders', 'units', 'revenue')), [(2, 8, Decimal('45.96'))]
+        )
+        self.assertEqual(
+            sorted(DailyStock.objects.values_list('category_id', 'units')),
+            [(self.fruit.id, 196), (self.dairy.id, 96)],
+        )
+
+    def test_reports_include_pending_deltas(self):
+        self.place_order((self.apples, 2), (self.milk, 4))
+        compact_sales_rollups()
+        self.place_order((self.apples, 1))
+
+        with self.assertNumQueries(2):
+            response = self.report('sales', start=self.today, end=self.today)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['orders'], response.data['units'], response.data['revenue']), (2, 7, '35.97')
+        )
+        self.assertEqual(response.data['periods'], [
+            {'orders': 2, 'units': 7, 'revenue': '35.97', 'period': self.today},
+        ])
+
+        response = self.report('categories')
+        self.assertEqual(
+            [(row['category_name'], row['orders'], row['revenue']) for row in response.data],
+            [('Fruit', 2, '29.97'), ('Dairy', 1, '6.00')],
+        )
+
+        response = self.report('products', category=self.fruit.id, limit=1)
+        self.assertEqual(response.data, [{
+            'product': self.apples.id, 'product_name': 'Product 0', 'category': self.fruit.id,
+            'units': 3, 'revenue': '29.97',
+        }])
+
+        response = self.report('stock')
+        self.assertEqual([(row['units'], row['value']) for row in response.data], [(294, '2122.02')])
+
+    def test_orders_of_several_categories_count_once_per_day(self):
+        self.place_order((self.apples, 1), (self.milk, 1))
+        self.assertEqual(self.report('sales').data['orders'], 1)
+        compact_sales_rollups()
+        self.assertEqual(self.report('sales').data['orders'], 1)
+        self.assertEqual([row['orders'] for row in self.report('categories').data], [1, 1])
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.report('sales', interval='month').data['orders'], 1)
+
+    def test_daily_sales_backfill(self):
+        backfill = import_module('store.migrations.0016_backfill_daily_sales').backfill_daily_sales
+        self.place_order((self.apples, 1), (self.milk, 1))
+        compact_sales_rollups()
+        self.place_order((self.pears, 2))
+        expected = self.report('sales').data
+
+        # As left by the deploy: days compacted without DailySales, and
+        # deltas appended before day_orders existed
+        DailySales.objects.all().delete()
+        SalesDelta.objects.update(day_orders=0)
+        backfill(django_apps, None)
+        self.assertEqual(self.report('sales').data, expected)
+        compact_sales_rollups()
+        self.assertEqual(self.report('sales').data, expected)
+
+    def test_report_query_count_is_independent_of_orders(self):
+        self.place_order((self.apples, 1))
+        compact_sales_rollups()
+        _, few = self.count_queries('get', '/api/store/analytics/sales/', data={'interval': 'month'})
+        for _ in range(5):
+            self.place_order((self.apples, 1), (self.milk, 1))
+        compact_sales_rollups()
+        _, many = self.count_queries('get', '/api/store/analytics/sales/', data={'interval': 'month'})
+        self.assertEqual(few, many)
+
+    def test_cancel_and_delete_take_orders_back(self):
+        first = self.place_order((self.apples, 2))
+        second = self.place_order((self.milk, 1))
+        compact_sales_rollups()
+
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'/api/store/orders/{first}/', data={'status': 'cancelled'}, format='json')
+        self.client.delete(f'/api/store/orders/{second}/')
+        compact_sales_rollups()
+
+        response = self.report('sales')
+        self.assertEqual((response.data['orders'], response.data['revenue']), (0, '0.00'))
+
+        self.client.patch(f'/api/store/orders/{first}/', data={'status': 'pending'}, format='json')
+        self.assertEqual(self.report('sales').data['revenue'], '19.98')
+
+    def test_rebuild_command(self):
+        self.place_order((self.apples, 2), (self.pears, 1))
+        self.place_order((self.apples, 1), (self.milk, 2))
+        compact_sales_rollups()
+        expected = self.report('categories').data
+
+        DailyCategorySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.report('categories').data, expected)
+        self.assertEqual(DailyProductSales.objects.count(), 3)
+
+    def test_invalid_range(self):
+        response = self.report('sales', start='2024-02-01', end='2024-01-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/store/analytics/sales/').status_code, 403)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class OrderExportTests(StoreTestMixin, TestCase):
+    url = '/api/store/orders/export/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = self.create_user('admin@example.com', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.customer = self.create_user()
+        self.apples, self.milk = self.create_products(2)
+        self.orders = []
+        for days_ago, status_ in ((10, 'delivered'), (1, 'pending'), (0, 'cancelled')):
+            order = Order.objects.create(user=self.customer, total_amount=Decimal('19.98'), status=status_)
+            Order.objects.filter(id=order.id).update(created_at=timezone.now() - timezone.timedelta(days=days_ago))
+            OrderItem.objects.create(order=order, product=self.apples, quantity=1, price=Decimal('9.99'))
+            OrderItem.objects.create(order=order, product=self.milk, quantity=1, price=Decimal('9.99'))
+            self.orders.append(order)
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(self.download())))
+        self.assertEqual(rows[0][:3], ['order_id', 'created_at', 'user_id'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [order.id for order in self.orders for _ in range(2)])
+        self.assertEqual(rows[1][3:], [
+            'customer@example.com', 'delivered', '19.98', str(self.apples.id), 'Product 0', '1', '9.99',
+        ])
+
+    def test_ndjson(self):
+        lines = self.download(output='ndjson').splitlines()
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual([order['id'] for order in orders], [order.id for order in self.orders])
+        self.assertEqual(orders[0]['items'], [
+            {'product': self.apples.id, 'product_name': 'Product 0', 'quantity': 1, 'price': '9.99'},
+            {'product': self.milk.id, 'product_name': 'Product 1', 'quantity': 1, 'price': '9.99'},
+        ])
+
+    def test_filters(self):
+        today = timezone.localdate()
+        lines = self.download(output='ndjson', start=str(today - timezone.timedelta(days=2)), end=str(today))
+        self.assertEqual(len(lines.splitlines()), 2)
+        lines = self.download(output='ndjson', status='delivered')
+        self.assertEqual([json.loads(line)['id'] for line in lines.splitlines()], [self.orders[0].id])
+        self.assertEqual(self.client.get(self.url, {'status': 'lost'}).status_code, 400)
+
+    def test_one_query_per_batch(self):
+        response = self.client.get(self.url, {'output': 'ndjson'})
+        # Six items in batches of two, and an empty one that ends the export
+        with self.assertNumQueries(4):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [order.id for order in self.orders])
+
+    @override_settings(EXPORT_CHUNK_SIZE=3)
+    def test_batches_continue_after_ties(self):
+        # Orders created at the same time, with their items split across batches
+        Order.objects.update(created_at=timezone.now())
+        rows = list(csv.reader(StringIO(self.download())))
+        self.assertEqual(
+            [(int(row[0]), int(row[6])) for row in rows[1:]],
+            [(order.id, product.id) for order in self.orders for product in (self.apples, self.milk)],
+        )
+
+    @mock.patch.object(
+        export_orders, 'delay', side_effect=lambda *args, **kwargs: export_orders.apply(args, kwargs)
+    )
+    def test_export_to_file(self, delay):
+        with tempfile.TemporaryDirectory() as export_dir, override_settings(EXPORT_DIR=export_dir):
+            response = self.client.post(self.url, {'output': 'csv', 'status': 'pending'}, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertTrue(response.data['url'].endswith(f"/api/store/orders/exports/{response.data['name']}/"))
+
+            download = self.client.get(response.data['url'])
+            self.assertEqual(download.status_code, 200)
+            rows = list(csv.reader(StringIO(b''.join(download.streaming_content).decode())))
+            download.close()
+            self.assertEqual({row[0] for row in rows[1:]}, {str(self.orders[1].id)})
+
+            self.assertEqual(self.client.get('/api/store/orders/exports/missing.csv/').status_code, 404)
+
+    def test_task_result(self):
+        with tempfile.TemporaryDirectory() as export_dir, override_settings(EXPORT_DIR=export_dir):
+            result = export_orders.apply(('orders.ndjson', 'ndjson'), {'start': str(timezone.localdate())}).get()
+            self.assertEqual(result, f"Orders exported to {os.path.join(export_dir, 'orders.ndjson')}")
+            with open(os.path.join(export_dir, 'orders.ndjson')) as f:
+                self.assertEqual(len(f.readlines()), 1)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class CatalogImportTests(StoreTestMixin, TestCase):
+    url = '/api/store/products/bulk_upsert/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.create_user('admin@example.com', is_staff=True))
+        self.fruit, self.dairy = self.create_category('Fruit'), self.create_category('Dairy')
+        self.apples, self.pears = self.create_products(2, category=self.fruit)
+        Product.objects.filter(id=self.apples.id).update(sku='APL-1')
+
+    def post_csv(self, text, **params):
+        return self.client.generic(
+            'POST', self.url + ('?dry_run=true' if params.get('dry_run') else ''),
+            text.encode(), content_type='text/csv',
+        )
+
+    def test_csv_upsert(self):
+        before = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_csv(
+                'sku,id,name,category,price,image_link,quantity\n'
+                'APL-1,,,,1.25,,40\n'
+                f'PER-1,{self.pears.id},,,,,7\n'
+                f'MLK-1,,Whole milk,{self.dairy.id},0.99,https://example.com/milk.jpg,\n'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'rows': 3, 'created': 1, 'updated': 2, 'error_count': 0, 'errors': [], 'dry_run': False,
+        })
+
+        self.apples.refresh_from_db()
+        self.assertEqual((self.apples.price, self.apples.quantity, self.apples.name), (Decimal('1.25'), 40, 'Product 0'))
+        self.assertGreater(self.apples.updated_at, self.apples.created_at)
+        self.assertEqual(Product.objects.get(id=self.pears.id).sku, 'PER-1')
+        milk = Product.objects.get(sku='MLK-1')
+        self.assertEqual((milk.category, milk.quantity), (self.dairy, 0))
+
+        self.assertNotEqual(get_catalog_version(), before)
+        self.assertEqual(
+            [product['id'] for product in self.client.get('/api/store/products/search/', {'q': 'milk'}).data],
+            [milk.id],
+        )
+
+    def test_row_errors_are_reported(self):
+        response = self.client.post(self.url, [
+            {'sku': 'APL-1', 'price': '-1'},
+            {'sku': 'NEW-1', 'name': 'No category'},
+            {'id': 999999, 'quantity': 1},
+            {'quantity': 1},
+            {'sku': 'APL-1', 'category': 999999},
+            {'sku': 'APL-1', 'id': self.pears.id},
+            {'sku': 'APL-1', 'colour': 'red'},
+            'not an object',
+            {'sku': 'APL-1', 'quantity': 3},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['error_count']), (1, 8))
+        self.assertEqual([error['row'] for error in response.data['errors']], list(range(1, 9)))
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        self.assertEqual(
+            sorted(response.data['errors'][1]['errors']), ['category', 'image_link', 'price']
+        )
+        self.assertEqual(Product.objects.get(id=self.apples.id).quantity, 3)
+
+    def test_new_sku_given_twice_in_a_batch(self):
+        milk, cheese = self.create_products(2, category=self.dairy)
+        response = self.post_csv(
+            'sku,id,name,category,price,image_link,quantity\n'
+            f'NEW-1,{self.pears.id},,,,,\n'
+            f'NEW-1,{milk.id},,,,,\n'
+            f'NEW-2,{cheese.id},,,,,\n'
+            f'NEW-2,,Cream,{self.dairy.id},2.50,https://example.com/cream.jpg,\n'
+            'APL-1,,,,,,9\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['error_count']), (1, 4))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 5])
+        self.assertEqual(response.data['errors'][0]['errors'], {'sku': ['Also given to another product in this batch.']})
+        self.assertFalse(Product.objects.filter(sku__startswith='NEW-').exists())
+        self.assertEqual(Product.objects.get(id=self.apples.id).quantity, 9)
+
+    def test_batches(self):
+        rows = ''.join(
+            f'{{"sku": "SKU-{i}", "name": "Item {i}", "category": {self.fruit.id}, '
+            f'"price": "1.00", "image_link": "https://example.com/{i}.jpg"}}\n'
+            for i in range(5)
+        ) + '{broken\n'
+        with override_settings(CATALOG_IMPORT_BATCH_SIZE=2):
+            response = self.client.generic('POST', self.url, rows.encode(), content_type='application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['error_count']), (5, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 6)
+        self.assertEqual(Product.objects.filter(sku__startswith='SKU-').count(), 5)
+
+    def test_dry_run(self):
+        response = self.post_csv('sku,quantity\nAPL-1,55\n', dry_run=True)
+        self.assertEqual((response.data['updated'], response.data['dry_run']), (1, True))
+        self.assertEqual(Product.objects.get(id=self.apples.id).quantity, 100)
+
+    def test_bad_input(self):
+        self.assertEqual(self.post_csv('sku,colour\nAPL-1,red\n').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'sku': 'APL-1'}, format='json').status_code, 400)
+
+    def test_category_change_moves_trend_score(self):
+        ProductTrendScore.objects.create(product=self.apples, category=self.fruit, score=1)
+        self.post_csv(f'sku,category\nAPL-1,{self.dairy.id}\n')
+        self.assertEqual(ProductTrendScore.objects.get().category, self.dairy)
+
+    def test_query_count_is_independent_of_rows(self):
+        def update(count):
+            rows = ''.join(f'{product.id},{count}\n' for product in Product.objects.all()[:count])
+            with CaptureQueriesContext(connection) as context:
+                self.post_csv('id,quantity\n' + rows)
+            return len(context.captured_queries)
+        self.create_products(20, category=self.dairy)
+        self.assertEqual(update(2), update(20))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('sku,quantity\nAPL-1,12\nMISSING,1\n')
+        self.addCleanup(os.remove, f.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', f.name, stdout=stdout, stderr=stderr)
+        self.assertIn('1 updated, 1 failed', stdout.getvalue())
+        self.assertIn('Row 3:', stderr.getvalue())
+        self.assertEqual(Product.objects.get(id=self.apples.id).quantity, 12)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.create_user())
+        self.assertEqual(self.post_csv('sku,quantity\nAPL-1,1\n').status_code, 403)
+
+
+@override_settings(BULK_EMAIL_CHUNK_SIZE=2, CACHES=TASK_CACHES)
+class BulkEmailTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        caches['tasks'].clear()
+        self.users = [self.create_user(f'user{i}@example.com') for i in range(5)]
+        self.create_user('inactive@example.com', is_active=False)
+
+    def send(self):
+        with mock.patch.object(
+            send_bulk_email_chunk, 'delay', side_effect=lambda *args: send_bulk_email_chunk.apply(args)
+        ) as delay:
+            result = send_bulk_email.apply(('Sale', 'Everything is 10% off'), task_id='campaign-1')
+        return result.get(), delay
+
+    def test_recipients_are_fanned_out_in_chunks(self):
+        result, delay = self.send()
+
+        self.assertEqual(result, 'Bulk email queued for 5 users in 3 chunks')
+        self.assertEqual(delay.call_count, 3)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(user.email for user in self.users)
+        )
+
+    def test_each_chunk_reuses_one_connection(self):
+        with mock.patch('store.tasks.get_connection', wraps=get_connection) as connect:
+            self.send()
+        self.assertEqual(connect.call_count, 3)
+
+    def test_retried_chunk_resumes_after_checkpoint(self):
+        first, second = self.users[:2]
+        caches['tasks'].set(bulk_email_checkpoint_key('campaign-1', first.id), first.id)
+
+        self.send()
+
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertNotIn(first.email, recipients)
+        self.assertIn(second.email, recipients)
+        self.assertEqual(len(recipients), 4)
+
+    def test_rejected_recipient_does_not_abort_the_chunk(self):
+        rejected = self.users[0].email
+        original_send = EmailMessage.send
+
+        def send(message, *args, **kwargs):
+            if message.to == [rejected]:
+                raise SMTPRecipientsRefused({rejected: (550, b'No such user')})
+            return original_send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', send):
+            self.send()
+        self.assertEqual(len(mail.outbox), 4)
+
+
+@override_settings(CACHES=TASK_CACHES)
+class LowStockDigestTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        caches['tasks'].clear()
+        self.admins = [self.create_user(f'admin{i}@example.com', is_staff=True) for i in range(3)]
+        self.create_user()
+        self.products = self.create_products(3, quantity=2)
+
+    def test_alerts_are_collected_into_one_digest_per_admin(self):
+        with mock.patch.object(send_low_stock_digest, 'apply_async') as schedule:
+            for product in self.products:
+                send_low_stock_alert.apply((product.id,))
+        schedule.assert_called_once_with(countdown=settings.LOW_STOCK_ALERT_WINDOW)
+        self.assertEqual(mail.outbox, [])
+
+        with mock.patch('store.tasks.get_connection', wraps=get_connection) as connect:
+            result = send_low_stock_digest.apply().get()
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(result, 'Low stock digest for 3 product(s) sent to 3 admins')
+
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(admin.email for admin in self.admins)
+        )
+        for product in self.products:
+            self.assertIn(f'{product.name}: 2 left', mail.outbox[0].body)
+        self.assertFalse(LowStockAlert.objects.filter(sent_at__isnull=True).exists())
+
+    def test_repeat_alerts_for_a_sku_are_suppressed(self):
+        product = self.products[0]
+        with mock.patch.object(send_low_stock_digest, 'apply_async'):
+            send_low_stock_alert.apply((product.id,))
+            send_low_stock_alert.apply((product.id,))
+            send_low_stock_digest.apply()
+            send_low_stock_alert.apply((product.id,))
+
+        self.assertEqual(LowStockAlert.objects.count(), 1)
+        self.assertEqual(send_low_stock_digest.apply().get(), 'No pending low stock alerts')
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_unknown_product(self):
+        self.assertEqual(send_low_stock_alert.apply((999999,)).get(), 'Product not found')
+        self.assertFalse(LowStockAlert.objects.exists())
+
+
+@override_settings(OUTBOX_RELAY_IN_BACKGROUND=False)
+class OrderOutboxTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = self.create_user()
+        self.client.force_authenticate(self.user)
+        self.product = self.create_products(1, quantity=5)[0]
+
+    def order(self, quantity=1):
+        return self.client.post(
+            '/api/store/orders/',
+            data={'items': [{'product': self.product.id, 'quantity': quantity}]},
+            format='json'
+        )
+
+    @mock.patch('store.outbox.current_app')
+    def test_confirmation_is_published_after_commit(self, app):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.order()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.task, 'store.tasks.send_order_confirmation')
+        self.assertEqual(event.args, [response.data['id']])
+        app.send_task.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        app.send_task.assert_called_once_with(
+            'store.tasks.send_order_confirmation', args=[response.data['id']], retry=False
+        )
+        event.refresh_from_db()
+        self.assertIsNotNone(event.published_at)
+
+    @mock.patch('store.outbox.current_app')
+    def test_rejected_order_emits_nothing(self, app):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.order(quantity=50)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OutboxEvent.objects.exists())
+        app.send_task.assert_not_called()
+
+    @mock.patch('store.outbox.current_app')
+    def test_broker_outage_leaves_events_for_the_sweeper(self, app):
+        app.send_task.side_effect = ConnectionError('broker down')
+        with self.assertLogs('store.outbox', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            first = self.order()
+            second = self.order()
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=False).exists())
+        self.assertTrue(OutboxEvent.objects.filter(attempts__gt=0).exists())
+
+        app.send_task.side_effect = None
+        app.send_task.reset_mock()
+        with override_settings(OUTBOX_BATCH_SIZE=1):
+            result = relay_outbox_events.apply().get()
+        self.assertEqual(result, 'Published 2 outbox event(s)')
+        self.assertEqual(
+            [c.kwargs['args'] for c in app.send_task.call_args_list],
+            [[first.data['id']], [second.data['id']]]
+        )
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+
+class OrderConfirmationTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user()
+
+    def create_order(self, item_count, user=None):
+        products = self.create_products(item_count)
+        order = Order.objects.create(
+            user=user or self.user, total_amount=Decimal('9.99') * 2 * item_count
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=2, price=product.price)
+            for product in products
+        )
+        return order
+
+    def test_confirmation_content(self):
+        order = self.create_order(2)
+        result = send_order_confirmation.apply((order.id,)).get()
+
+        self.assertEqual(result, f'Order confirmation sent for Order #{order.id}')
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, f'Order Confirmation - Order #{order.id}')
+        self.assertEqual(message.to, [self.user.email])
+        self.assertIn(f'Dear {self.user.email},', message.body)
+        self.assertIn('Total Amount: $39.96', message.body)
+        self.assertIn('- Product 0 x 2 @ $9.99 each', message.body)
+        self.assertIn('- Product 1 x 2 @ $9.99 each', message.body)
+
+    def test_query_count_is_independent_of_item_count(self):
+        small, large = self.create_order(1), self.create_order(25)
+        for order in (small, large):
+            with self.assertNumQueries(2):
+                send_order_confirmation.apply((order.id,))
+
+    def test_unknown_order(self):
+        self.assertEqual(send_order_confirmation.apply((999999,)).get(), 'Order not found')
+
+    @override_settings(ORDER_CONFIRMATION_BATCH_SIZE=2)
+    def test_batch_sends_over_one_connection(self):
+        orders = [
+            self.create_order(2, self.create_user(f'buyer{i}@example.com')) for i in range(5)
+        ]
+        order_ids = [order.id for order in orders] + [999999]
+
+        with mock.patch('store.tasks.get_connection', wraps=get_connection) as connect, \
+                self.assertNumQueries(6):
+            result = send_order_confirmations.apply((order_ids,)).get()
+
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(result, 'Order confirmations sent for 5 of 6 orders')
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            sorted(order.user.email for order in orders)
+        )
+
+
+class ValuesProjectionTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user()
+        self.products = self.create_products(6)
+        # Prices whose products don't come out exact in floating point
+        Product.objects.filter(id=self.products[0].id).update(price=Decimal('0.10'))
+        Product.objects.filter(id=self.products[1].id).update(price=Decimal('1234567.89'))
+
+        for quantity, product in enumerate(self.products[:4], start=1):
+            Cart.objects.create(user=self.user, product=product, quantity=quantity * 3)
+        for i in range(3):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('10.5'), status='shipped')
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, quantity=2, price=product.price)
+                for product in self.products[:i]
+            )
+
+    def get_projection(self, viewset_class):
+        return viewset_class().get_values_projection()
+
+    def assertMatchesSerializer(self, viewset_class, serializer_class, queryset):
+        queryset = queryset.order_by('-created_at', '-id')
+        projection = self.get_projection(viewset_class)
+        self.assertEqual(
+            projection.represent(projection.values(queryset)),
+            serializer_class(queryset, many=True).data,
+        )
+
+    def test_matches_serializers(self):
+        self.assertMatchesSerializer(ProductViewSet, ProductSerializer, Product.objects.all())
+        self.assertMatchesSerializer(CartViewSet, CartSerializer, Cart.objects.all())
+        self.assertMatchesSerializer(OrderViewSet, OrderSerializer, Order.objects.all())
+
+    def test_matches_serializers_in_another_timezone(self):
+        with timezone.override('Asia/Dhaka'):
+            self.assertMatchesSerializer(OrderViewSet, OrderSerializer, Order.objects.all())
+
+    def test_list_endpoints_match_serializers(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        endpoints = [
+            ('/api/store/products/', ProductSerializer, Product.objects.all()),
+            ('/api/store/carts/', CartSerializer, Cart.objects.filter(user=self.user)),
+            ('/api/store/orders/', OrderSerializer, Order.objects.filter(user=self.user)),
+        ]
+        for url, serializer_class, queryset in endpoints:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            expected = serializer_class(queryset.order_by('-created_at', '-id'), many=True).data
+            self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+
+    def test_nested_items_take_one_query_per_page(self):
+        projection = self.get_projection(OrderViewSet)
+        with self.assertNumQueries(2):
+            rows = projection.represent(projection.values(Order.objects.all()))
+        self.assertEqual(sorted(len(row['items']) for row in rows), [0, 1, 2])
+
+    def test_unmapped_source_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesProjection(CartSerializer)
+
+
+class AsyncViewTests(StoreTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user()
+        self.products = self.create_products(5)
+        for product in self.products[:3]:
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth_header = f'Bearer {token}'
+
+    def sync_get(self, url, **headers):
+        return APIClient().get(url, headers=headers)
+
+    async def assertMatchesSyncView(self, url, **headers):
+        expected = await sync_to_async(self.sync_get)(url, **headers)
+        response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    async def test_catalog_matches_sync_views(self):
+        await self.assertMatchesSyncView('/api/store/categories/')
+        await self.assertMatchesSyncView(f'/api/store/products/{self.products[0].id}/')
+        await self.assertMatchesSyncView('/api/store/products/999999/')
+        await self.assertMatchesSyncView(f'/api/store/products/?category={self.products[0].category_id}')
+
+    async def test_errors_match_sync_views(self):
+        await self.assertMatchesSyncView('/api/store/products/?cursor=garbage')
+        await self.assertMatchesSyncView('/api/store/carts/?cursor=garbage', authorization=self.auth_header)
+        response = await self.assertMatchesSyncView('/api/store/products/', authorization='Bearer garbage')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    async def test_content_negotiation_matches_sync_views(self):
+        response = await self.async_client.get('/api/store/categories/', headers={'accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+        response = await self.assertMatchesSyncView('/api/store/products/', accept='application/xml')
+        self.assertEqual(response.status_code, 406)
+
+    async def test_validators_match_sync_views(self):
+        url = '/api/store/products/'
+        etag = (await sync_to_async(self.sync_get)(url))['ETag']
+        response = await self.async_client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_concurrent_rebuild_serves_previous_response(self):
+        url = '/api/store/categories/'
+        before = await self.async_client.get(url)
+        await sync_to_async(bump_catalog_version)()
+
+        key = f'store:catalog:{await aget_catalog_version()}:http://testserver{url}'
+        await cache.aadd(f'{key}:lock', 1)
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json(), before.json())
+        self.assertEqual(response['ETag'], before['ETag'])
+        self.assertNotIn('Last-Modified', response)
+
+    async def test_product_pages_match_sync_views(self):
+        url = '/api/store/products/?page_size=2'
+        pages = 0
+        while url:
+            response = await self.assertMatchesSyncView(url)
+            url = response.json()['next']
+            pages += 1
+        self.assertEqual(pages, 3)
+
+    async def test_cart_list(self):
+        response = await self.assertMatchesSyncView(
+            '/api/store/carts/', authorization=self.auth_header
+        )
+        self.assertEqual(len(response.json()['results']), 3)
+
+        response = await self.async_client.get('/api/store/carts/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_cached_catalog_is_shared_with_sync_views(self):
+        url = '/api/store/categories/'
+        await self.async_client.get(url)
+
+        def sync_get_from_cache():
+            with self.assertNumQueries(0):
+                return self.sync_get(url)
+
+        response = await sync_to_async(sync_get_from_cache)()
+        self.assertEqual(response.status_code, 200)
+
+    async def test_writes_go_through_viewsets(self):
+        response = await self.async_client.post(
+            '/api/store/carts/', {'product': self.products[4].id},
+            content_type='application/json', headers={'authorization': self.auth_header},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Cart.objects.filter(user=self.user).acount(), 4)
@@ -0,0 +1,115 @@
+"""
+Trending products ranked by recent sales, with older sales decaying away.
+
+Each product that sold recently has a ``ProductTrendScore``: the quantity
+sold, with every sale weighted by ``0.5 ** (age / TRENDING_HALF_LIFE)``.
+``update_trending_scores`` runs periodically and only reads the order items
+added since its last run, by id. Decaying the existing scores to the new
+time is one UPDATE over the compact score table, as multiplying every score
+by the same factor keeps the sums exact.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import OrderItem, ProductTrendScore, TrendingState
+
+
+def decay(seconds):
+    """Weight of a sale ``seconds`` old"""
+    return 0.5 ** (max(seconds, 0) / settings.TRENDING_HALF_LIFE)
+
+
+def get_state():
+    """The locked trending state row, created on the first run"""
+    state, _ = TrendingState.objects.select_for_update().get_or_create(pk=1)
+    return state
+
+
+def new_sales(after_id, until_id, since):
+    """
+    Quantity sold per product and hour for order items with ids in
+    ``(after_id, until_id]``, from orders created at ``since`` or later
+    """
+    return (
+        OrderItem.objects.filter(id__gt=after_id, id__lte=until_id, order__created_at__gte=since)
+        .exclude(order__status='cancelled')
+        .values('product_id', 'product__category_id', hour=TruncHour('order__created_at'))
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+
+
+def upsert_scores(scores):
+    """Write ``{product_id: (category_id, score)}`` in one statement per batch"""
+    rows = [
+        ProductTrendScore(product_id=product_id, category_id=category_id, score=score)
+        for product_id, (category_id, score) in scores.items()
+    ]
+    kwargs = {}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['product']
+    ProductTrendScore.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True, update_fields=['category', 'score'], **kwargs
+    )
+
+
+@transaction.atomic
+def update_trending_scores(now=None):
+    """
+    Fold the order items added since the last run into the trend scores.
+    Returns the number of products whose score changed.
+
+    Items of orders younger than ``TRENDING_SETTLE_DELAY`` wait for the next
+    run, so an order still committing when a later one was folded in is not
+    skipped by the id watermark.
+    """
+    now = now or timezone.now()
+    state = get_state()
+
+    if state.computed_at is not None and now > state.computed_at:
+        factor = decay((now - state.computed_at).total_seconds())
+        ProductTrendScore.objects.update(score=F('score') * factor)
+
+    until_id = OrderItem.objects.filter(
+        id__gt=state.last_order_item_id,
+        order__created_at__lte=now - timedelta(seconds=settings.TRENDING_SETTLE_DELAY),
+    ).aggregate(last=Max('id'))['last']
+
+    scores = {}
+    if until_id is not None:
+        since = now - timedelta(seconds=settings.TRENDING_WINDOW)
+        for sale in new_sales(state.last_order_item_id, until_id, since):
+            product_id = sale['product_id']
+            _, score = scores.get(product_id, (None, 0.0))
+            # Weighted at the middle of its hour
+            age = (now - sale['hour']).total_seconds() - 30 * 60
+            scores[product_id] = (sale['product__category_id'], score + sale['quantity'] * decay(age))
+
+        existing = ProductTrendScore.objects.filter(product_id__in=scores).values_list('product_id', 'score')
+        for product_id, score in existing:
+            category_id, added = scores[product_id]
+            scores[product_id] = (category_id, score + added)
+        if scores:
+            upsert_scores(scores)
+        state.last_order_item_id = until_id
+
+    ProductTrendScore.objects.filter(score__lt=settings.TRENDING_MIN_SCORE).delete()
+    state.computed_at = now
+    state.save()
+    return len(scores)
+
+
+def top_products(category_id=None, limit=10):
+    """
+    The ``limit`` highest scoring products, read in order from the score
+    index so the cost depends on ``limit`` only
+    """
+    scores = ProductTrendScore.objects.select_related('product__category').order_by('-score')
+    if category_id is not None:
+        scores = scores.filter(category_id=category_id)
+    return scores[:limit]
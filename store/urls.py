@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
+    AnalyticsViewSet,
     CategoryViewSet,
     EmailViewSet,
     ProductViewSet,
@@ -14,6 +15,7 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'carts', CartViewSet, basename='cart')
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'emails', EmailViewSet, basename='email')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 
 urlpatterns = [
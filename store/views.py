@@ -1,22 +1,51 @@
+import codecs
+import os
+import uuid
+
 from rest_framework import viewsets
 from rest_framework.decorators import action 
 from rest_framework.response import Response
+from django.conf import settings
 from django.db import transaction
 from rest_framework import status 
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.db.models import Q
-from store.tasks import send_bulk_email, send_low_stock_alert, send_order_confirmation
+from django.db.models import DecimalField, ExpressionWrapper, F, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.reverse import reverse
+from store.tasks import export_orders, send_bulk_email, send_low_stock_alert, send_order_confirmation
+from . import analytics
+from .catalog_import import CatalogImportError, CatalogImporter, read_csv, read_ndjson
+from .export import CONTENT_TYPES, async_chunks, export_chunks, export_path
+from .cart import add_to_cart, get_cart_summary, invalidate_cart_summary
+from .inventory import reserve_stock
+from .mixins import CatalogCacheMixin, EagerLoadingMixin, ValuesListMixin
+from .outbox import enqueue_task
 from .models import Category, Product, Cart, Order
+from .search import filter_products, ranked_products
+from .trending import top_products
 from .serializers import (
     CategorySerializer, 
     ProductSerializer, 
+    TrendingProductSerializer,
     CartSerializer, 
+    CartAddSerializer,
+    CartBulkAddSerializer,
     OrderSerializer,
+    OrderExportSerializer,
+    AnalyticsQuerySerializer,
+    SalesPeriodSerializer,
+    SalesTotalsSerializer,
+    CategorySalesSerializer,
+    ProductSalesSerializer,
+    StockSerializer,
 )
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = None  # Small lookup list, always returned whole
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -24,17 +53,30 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return []
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogCacheMixin, ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    select_related_fields = ('category',)
+    only_fields = (
+        'id', 'sku', 'name', 'category', 'category__name', 'price',
+        'image_link', 'created_at', 'is_trending',
+    )
+    read_actions = ('list', 'retrieve', 'search', 'trending')
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk_upsert']:
             return [IsAdminUser()]
         return []
 
+    def is_cacheable(self, request):
+        # Filtered searches are too varied to be worth caching
+        filters = ('name', 'category', 'is_trending')
+        return super().is_cacheable(request) and not any(
+            param in request.query_params for param in filters
+        )
+
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = self.eager_load(Product.objects.all())
         
         # Retrieve query parameters
         name = self.request.query_params.get('name')
@@ -43,7 +85,7 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         # Apply filters based on query parameters
         if name:
-            queryset = queryset.filter(name__icontains=name)
+            queryset = filter_products(queryset, name)
         if category:
             queryset = queryset.filter(category=category)
         if is_trending is not None:
@@ -51,6 +93,62 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Best matches for ``q``, ranked by relevance, for autocomplete"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+
+        products = ranked_products(self.get_queryset(), query, max(limit, 1))
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Best selling products of late, overall or in one ``category``"""
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.TRENDING_MAX_LIMIT)
+            category = request.query_params.get('category')
+            category = int(category) if category else None
+        except ValueError:
+            return Response(
+                {"detail": "category and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = []
+        for trend in top_products(category, max(limit, 1)):
+            trend.product.trending_score = round(trend.score, 4)
+            products.append(trend.product)
+        return Response(TrendingProductSerializer(products, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request):
+        """
+        Create or update many products: a JSON list, or a CSV or NDJSON
+        body (``text/csv``, ``application/x-ndjson``) read as it streams in.
+        Rows are matched by ``sku``, else ``id``; ``?dry_run=true`` only
+        validates them.
+        """
+        importer = CatalogImporter(dry_run=request.query_params.get('dry_run', '').lower() in ['true', '1'])
+        lines = codecs.iterdecode(request._request, 'utf-8-sig')
+        try:
+            if request.content_type.startswith('text/csv'):
+                rows = read_csv(lines)
+            elif request.content_type.startswith('application/x-ndjson'):
+                rows = read_ndjson(lines)
+            elif isinstance(request.data, list):
+                rows = enumerate(request.data, start=1)
+            else:
+                raise CatalogImportError('Expected a JSON list of products')
+            importer.run(rows)
+        except CatalogImportError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(importer.report())
+
     @action(detail=True, methods=['post'])
     def alert_low_stock(self, request, pk=None):
         """Trigger low stock alert for a product"""
@@ -61,43 +159,67 @@ class ProductViewSet(viewsets.ModelViewSet):
         )
 
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
+    select_related_fields = ('product',)
+    values_expressions = {
+        'total_price': ExpressionWrapper(
+            F('quantity') * F('product__price'),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+    }
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
-
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        return self.eager_load(Cart.objects.filter(user_id=self.request.user.id))
 
     def create(self, request, *args, **kwargs):
-        # Check if product already in cart
-        product_id = request.data.get('product')
-        existing_item = Cart.objects.filter(
-            user=request.user,
-            product_id=product_id
-        ).first()
-
-        if existing_item:
-            # Update quantity instead of creating new item
-            quantity = int(request.data.get('quantity', 1))
-            existing_item.quantity += quantity
-            existing_item.save()
-            serializer = self.get_serializer(existing_item)
-            return Response(serializer.data)
+        # Adding a product already in the cart increases its quantity
+        serializer = CartAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = serializer.validated_data['product']
+
+        created = add_to_cart(request.user.id, [(product.id, serializer.validated_data['quantity'])])
+
+        cart_item = self.get_queryset().get(product=product)
+        return Response(
+            self.get_serializer(cart_item).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Add many products to the cart at once"""
+        serializer = CartBulkAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+
+        add_to_cart(request.user.id, [(item['product'], item['quantity']) for item in items])
+
+        cart_items = self.get_queryset().filter(
+            product_id__in={item['product'] for item in items}
+        )
+        return Response(self.get_serializer(cart_items, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Item count, subtotal and per-category totals of the cart"""
+        return Response(get_cart_summary(request.user.id))
 
-        return super().create(request, *args, **kwargs)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_cart_summary(self.request.user.id)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_cart_summary(self.request.user.id)
 
     def list(self, request, *args, **kwargs):
         product_id = request.query_params.get('product', None)
         
         if product_id is not None:
             # Try to get single cart item for the specific product
-            cart_item = Cart.objects.filter(
-                user=request.user,
-                product_id=product_id
-            ).first()
+            cart_item = self.get_queryset().filter(product_id=product_id).first()
             
             if not cart_item:
                 return Response(
@@ -109,30 +231,30 @@ class CartViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(cart_item)
             return Response(serializer.data)
         
-        # If no product_id, return all cart items as before
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # If no product_id, return a page of cart items
+        return super().list(request, *args, **kwargs)
     
     # Custom delete action for deleting all items
     @action(detail=False, methods=['delete'])
     def clear(self, request):
         deleted_count, _ = self.get_queryset().delete()
+        invalidate_cart_summary(request.user.id)
         return Response(
             {"detail": f"Successfully deleted {deleted_count} items from cart"},
             status=status.HTTP_204_NO_CONTENT
         )
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_related_fields = ('items',)
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Order.objects.prefetch_related('items').all()
-        return Order.objects.prefetch_related('items').filter(user=user)
+            return self.eager_load(Order.objects.all())
+        return self.eager_load(Order.objects.filter(user_id=user.id))
 
     @transaction.atomic
     def create(self, request):
@@ -143,9 +265,118 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
     def perform_create(self, serializer):
-        order = serializer.save(user=self.request.user)
-        # Send order confirmation email asynchronously
-        #send_order_confirmation.delay(order.id)
+        items = serializer.validated_data['items']
+        reserve_stock(items)
+        order = serializer.save(user_id=self.request.user.id)
+        analytics.record_order_sales(order, [
+            (item['product'].id, item['product'].category_id, item['quantity'], item['product'].price)
+            for item in items
+        ])
+        # Send order confirmation email asynchronously once the order commits
+        enqueue_task(send_order_confirmation.name, order.id)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        was_cancelled = serializer.instance.status == 'cancelled'
+        order = serializer.save()
+        # Cancelling takes the order out of the sales rollups, reopening puts it back
+        if was_cancelled != (order.status == 'cancelled'):
+            analytics.record_order_sales(order, analytics.order_items(order), sign=1 if was_cancelled else -1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        if instance.status != 'cancelled':
+            analytics.record_order_sales(instance, analytics.order_items(instance), sign=-1)
+        instance.delete()
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream orders with their items as CSV or NDJSON (?output=, ?start=,
+        ?end=, ?status=). POST the same fields to have the export written
+        to a file by a worker instead, to download from ``exports/{name}/``.
+        """
+        serializer = OrderExportSerializer(data=request.query_params if request.method == 'GET' else request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        output = filters.pop('output')
+
+        if request.method == 'POST':
+            name = f"orders-{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.{output}"
+            export_orders.delay(name, output, **{key: str(value) for key, value in filters.items()})
+            return Response(
+                {"name": name, "url": reverse('order-download-export', args=[name], request=request)},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        chunks = export_chunks(output, **filters)
+        if isinstance(request._request, ASGIRequest):
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
+    @action(
+        detail=False, methods=['get'], permission_classes=[IsAdminUser],
+        url_path=r'exports/(?P<name>[\w-]+\.(?:csv|ndjson))',
+    )
+    def download_export(self, request, name):
+        """An export written by a worker, or 202 while it is still being written"""
+        path = export_path(name)
+        if os.path.exists(path):
+            return FileResponse(
+                open(path, 'rb'), as_attachment=True, content_type=CONTENT_TYPES[name.rsplit('.', 1)[1]]
+            )
+        if os.path.exists(f'{path}.part'):
+            return Response({"detail": "Export in progress"}, status=status.HTTP_202_ACCEPTED)
+        raise Http404
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales and stock reports for admin dashboards, read from the daily
+    rollups kept by ``store.analytics`` rather than from the orders
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_query(self, request):
+        serializer = AnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @action(detail=False, methods=['get'])
+    def sales(self, request):
+        """Orders, units and revenue per day or month (?start=, ?end=, ?interval=)"""
+        query = self.get_query(request)
+        periods = analytics.sales_over_time(query['start'], query['end'], query['interval'])
+        totals = {name: sum(period[name] for period in periods) for name in analytics.TOTALS}
+        return Response({
+            'start': query['start'],
+            'end': query['end'],
+            **SalesTotalsSerializer(totals).data,
+            'periods': SalesPeriodSerializer(periods, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        """Sales of each category, best selling first (?start=, ?end=)"""
+        query = self.get_query(request)
+        rows = analytics.sales_by_category(query['start'], query['end'])
+        return Response(CategorySalesSerializer(rows, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        """Best selling products (?start=, ?end=, ?category=, ?limit=)"""
+        query = self.get_query(request)
+        rows = analytics.sales_by_product(query['start'], query['end'], query.get('category'), query['limit'])
+        return Response(ProductSalesSerializer(rows, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def stock(self, request):
+        """Units and value in stock at the end of each day (?start=, ?end=)"""
+        query = self.get_query(request)
+        rows = analytics.stock_on_hand(query['start'], query['end'])
+        return Response(StockSerializer(rows, many=True).data)
 
 
 class EmailViewSet(viewsets.ViewSet):